@@ -1,10 +1,22 @@
 import asyncio
-from typing import Coroutine
+from typing import Any, Awaitable, Callable, Coroutine, Dict
 
 ABANDONED_TASKS = set()
+IN_FLIGHT: Dict[str, asyncio.Task] = {}
 
 
 def create_task_safely(coroutine: Coroutine) -> None:
     task = asyncio.create_task(coroutine)
     ABANDONED_TASKS.add(task)
     task.add_done_callback(ABANDONED_TASKS.discard)
+
+
+def share_in_flight(key: str, factory: Callable[[], Coroutine[Any, Any, Any]]) -> Awaitable[Any]:
+    task = IN_FLIGHT.get(key)
+    if task is None:
+        task = asyncio.create_task(factory())
+        IN_FLIGHT[key] = task
+        task.add_done_callback(lambda done: IN_FLIGHT.pop(key) if IN_FLIGHT.get(key) is done else None)
+
+    # shield so that a cancelled (disconnected) caller does not cancel the call shared with the others
+    return asyncio.shield(task)
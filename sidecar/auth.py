@@ -1,13 +1,20 @@
+import asyncio
+import time
 from typing import Optional, Tuple
 
 from fastapi import Depends, HTTPException, Security, status
 from fastapi.security import APIKeyQuery, HTTPAuthorizationCredentials, HTTPBearer
+from genesis.logging import logger
 
 from sidecar.config import CONFIG, REDIS
+from sidecar.memory_cache import LRUCache
 
 api_key_query_auth = APIKeyQuery(name="api_key", auto_error=False)
 api_key_header_auth = HTTPBearer(auto_error=False)
 
+# api key -> (limit or None for invalid keys, expires at), a flood of random keys evicts only the least recently used
+API_KEYS_CACHE: LRUCache[Tuple[Optional[bytes], float]] = LRUCache(CONFIG.api_key_cache_size)
+
 
 async def get_api_key(
     api_key_header: HTTPAuthorizationCredentials = Depends(api_key_header_auth),
@@ -16,15 +23,62 @@ async def get_api_key(
     return api_key_query or (api_key_header.credentials if api_key_header else None)
 
 
-async def get_api_key_and_limit(api_key: Optional[str] = Depends(get_api_key)) -> Tuple[Optional[str], Optional[float]]:
+async def get_api_key_and_limit(api_key: Optional[str] = Depends(get_api_key)) -> Tuple[Optional[str], float]:
     if not api_key:
         return None, CONFIG.limit_default
 
-    api_key_limit = await REDIS.hget(CONFIG.api_key_hash, api_key)
-    if api_key and not api_key_limit:
+    api_key_limit = await get_api_key_limit(api_key)
+    if not api_key_limit:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid API Key",
         )
 
     return api_key, float(api_key_limit)
+
+
+def is_api_key_cached(api_key: str) -> bool:
+    cached = API_KEYS_CACHE.get(api_key)
+    return cached is not None and cached[1] > time.monotonic()
+
+
+def cache_api_key_limit(api_key: str, api_key_limit: Optional[bytes]) -> None:
+    ttl = CONFIG.api_key_cache_ttl if api_key_limit else CONFIG.api_key_cache_negative_ttl
+    API_KEYS_CACHE.set(api_key, (api_key_limit, time.monotonic() + ttl))
+
+
+async def get_api_key_limit(api_key: str) -> Optional[bytes]:
+    cached = API_KEYS_CACHE.get(api_key)
+    if cached is not None and cached[1] > time.monotonic():
+        return cached[0]
+
+    api_key_limit: Optional[bytes] = await REDIS.hget(CONFIG.api_key_hash, api_key)
+    cache_api_key_limit(api_key, api_key_limit)
+    return api_key_limit
+
+
+async def invalidate_api_keys_on_change() -> None:
+    # Changes are announced either explicitly on api_key_channel
+    # or by redis itself when keyspace notifications for hashes are enabled (notify-keyspace-events Kh).
+    pubsub = REDIS.pubsub()
+    await pubsub.subscribe(CONFIG.api_key_channel)
+    await pubsub.psubscribe(f"__keyspace@*__:{CONFIG.api_key_hash}")
+    try:
+        async for message in pubsub.listen():
+            if message["type"] in ("message", "pmessage"):
+                logger.info("API keys changed, invalidating cache")
+                API_KEYS_CACHE.clear()
+    finally:
+        await pubsub.close()
+
+
+async def invalidate_api_keys_on_change_forever() -> None:
+    while True:
+        try:
+            await invalidate_api_keys_on_change()
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Listening for API key changes failed")
+
+        # changes might have been missed while disconnected
+        API_KEYS_CACHE.clear()
+        await asyncio.sleep(1)
@@ -0,0 +1,89 @@
+import asyncio
+from collections import deque
+from itertools import islice
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Deque,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+)
+
+from fastapi import HTTPException, Response, status
+from genesis.blockchain.exceptions import DoesNotExist, SkippedBlock
+
+from sidecar.caching import get_cached_many
+from sidecar.config import CONFIG
+from sidecar.executor import serialize
+
+MISSING_ITEM_STATUS_CODES = (status.HTTP_404_NOT_FOUND, status.HTTP_204_NO_CONTENT)
+
+
+async def fetch_item(fetch: Callable[[], Awaitable[Response]], semaphore: asyncio.Semaphore) -> Optional[bytes]:
+    async with semaphore:
+        try:
+            response = await fetch()
+        except HTTPException as exc:
+            if exc.status_code in MISSING_ITEM_STATUS_CODES:
+                return None
+            raise
+
+    return response.body
+
+
+async def stream_json_array(
+    keys: List[str], fetchers: Sequence[Callable[[], Awaitable[Response]]], immutable: bool = False
+) -> AsyncIterator[bytes]:
+    # Cache hits are resolved with a single MGET, misses are fetched concurrently
+    # and items are streamed in the requested order as soon as they are available.
+    # Items which do not exist are returned as null.
+    cached = await get_cached_many(keys, immutable)
+    semaphore = asyncio.Semaphore(CONFIG.batch_concurrency)
+    tasks = [
+        None if value else asyncio.create_task(fetch_item(fetch, semaphore)) for value, fetch in zip(cached, fetchers)
+    ]
+
+    try:
+        yield b"["
+        for index, (value, task) in enumerate(zip(cached, tasks)):
+            if task is not None:
+                value = await task
+            yield (b"," if index else b"") + (value or b"null")
+        yield b"]"
+    finally:
+        for task in tasks:
+            if task is not None:
+                task.cancel()
+
+
+async def fetch_serialized(fetch: Callable[[], Awaitable[Any]]) -> Optional[bytes]:
+    try:
+        response = await fetch()
+    except (DoesNotExist, SkippedBlock):
+        return None
+
+    return await serialize(response)
+
+
+async def stream_ndjson(fetchers: Iterable[Callable[[], Awaitable[Any]]]) -> AsyncIterator[bytes]:
+    # At most export_window items are being fetched at once. The window is refilled only after a line is sent,
+    # so a slow client suspends fetching and memory does not grow with the size of the range.
+    # Items which do not exist are returned as null.
+    fetchers = iter(fetchers)
+    window: Deque[asyncio.Task] = deque(
+        asyncio.create_task(fetch_serialized(fetch)) for fetch in islice(fetchers, CONFIG.export_window)
+    )
+
+    try:
+        while window:
+            serialized = await window.popleft()
+            for fetch in islice(fetchers, 1):
+                window.append(asyncio.create_task(fetch_serialized(fetch)))
+            yield (serialized or b"null") + b"\n"
+    finally:
+        for task in window:
+            task.cancel()
@@ -0,0 +1,63 @@
+import argparse
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+from fastapi.responses import ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from genesis.blockchain.bitcoin.tests.fixtures.block import BLOCK_DECODED
+from genesis.blockchain.bitcoin.tests.fixtures.pubkey_transaction import (
+    TRANSACTION_DECODED,
+)
+from genesis.encoders import fast_serializer_to_bytes
+from genesis.models import PlainBlock
+
+from sidecar.caching import json_response
+
+RESPONSE_FIELD = create_response_field(name="Response_benchmark", type_=PlainBlock)
+
+
+def make_block(transactions: int) -> PlainBlock:
+    # a decoded transaction repeated under distinct hashes, as large as a busy Ethereum block
+    return BLOCK_DECODED.copy(
+        update=dict(transactions=[TRANSACTION_DECODED.copy(update=dict(hash=f"{i:064x}")) for i in range(transactions)])
+    )
+
+
+async def respond_with_model(block: PlainBlock) -> None:
+    # serialized once for redis, then validated against response_model and serialized again by ORJSONResponse
+    fast_serializer_to_bytes(block.dict())
+    content = await serialize_response(field=RESPONSE_FIELD, response_content=block)
+    ORJSONResponse(content=content)
+
+
+async def respond_with_bytes(block: PlainBlock) -> None:
+    json_response(fast_serializer_to_bytes(block.dict()))
+
+
+async def measure(respond: Callable[[PlainBlock], Awaitable[None]], block: PlainBlock, repeat: int) -> float:
+    start = time.process_time()
+    for _ in range(repeat):
+        await respond(block)
+    return (time.process_time() - start) / repeat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare CPU time spent on a cache miss response of a large block")
+    parser.add_argument("--transactions", type=int, default=5000, help="transactions of the synthetic block")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    block = make_block(args.transactions)
+    with_model = asyncio.run(measure(respond_with_model, block, args.repeat))
+    with_bytes = asyncio.run(measure(respond_with_bytes, block, args.repeat))
+
+    print(f"block of {args.transactions} transactions, {len(fast_serializer_to_bytes(block.dict()))} bytes")
+    print(f"pydantic response: {with_model * 1000:.3f} ms CPU per request")
+    print(f"raw bytes response: {with_bytes * 1000:.3f} ms CPU per request")
+    print(f"saved: {(with_model - with_bytes) * 1000:.3f} ms CPU per request ({1 - with_bytes / with_model:.0%})")
+
+
+if __name__ == "__main__":
+    main()
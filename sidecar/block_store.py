@@ -0,0 +1,240 @@
+import asyncio
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import zlib
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from genesis.logging import logger
+
+from sidecar.compression import VARIANT_SEPARATOR
+from sidecar.config import CONFIG
+
+# checksum of the key and the value, length of the key and length of the value, followed by the key and the value
+RECORD = struct.Struct("<IHI")
+# magic, whether the index was replaced by a larger one, number of slots, used slots,
+# and the segment and its length up to which records are complete
+INDEX_HEADER = struct.Struct("<4sIQQQQ")
+# digest of the key, 0 for an empty slot, segment and offset of the record
+INDEX_SLOT = struct.Struct("<QIQ")
+INDEX_MAGIC = b"SBS1"
+INDEX_INITIAL_SLOTS = 1 << 16
+
+
+def get_digest(key: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little") or 1
+
+
+def get_checksum(key: bytes, value: bytes) -> int:
+    return zlib.crc32(value, zlib.crc32(key))
+
+
+def iter_slots(index: mmap.mmap, digest: int) -> Iterator[int]:
+    # open addressing with linear probing, the table is never more than half full
+    slots = INDEX_HEADER.unpack_from(index)[2]
+    for probe in range(slots):
+        yield INDEX_HEADER.size + (digest + probe) % slots * INDEX_SLOT.size
+
+
+def insert_slot(index: mmap.mmap, digest: int, segment: int, offset: int) -> None:
+    for position in iter_slots(index, digest):
+        if not INDEX_SLOT.unpack_from(index, position)[0]:
+            INDEX_SLOT.pack_into(index, position, digest, segment, offset)
+            return
+
+
+class BlockStore:
+    # Values are appended to segment files and located by a hash table in the index file, which every process
+    # maps to memory instead of reading it. Writes of all processes on the host are serialized by a file lock.
+    def __init__(self, path: str, segment_size: int, prefixes: Sequence[str]) -> None:
+        self.path = path
+        self.segment_size = segment_size
+        # keys of other prefixes are never persisted and are not looked up
+        self.prefixes = tuple(prefixes)
+        self.index: Optional[mmap.mmap] = None
+        self.maps: Dict[int, mmap.mmap] = {}
+        self.index_lock = threading.Lock()
+
+        os.makedirs(path, exist_ok=True)
+        with self.locked():
+            self.recover()
+
+    def get_path(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def get_segment_path(self, segment: int) -> str:
+        return self.get_path(f"{segment:08d}.segment")
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        with open(self.get_path("lock"), "ab") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def create_index(self, slots: int, segment: int, end: int) -> mmap.mmap:
+        # created next to the index and renamed over it, readers keep the previous one until they notice it was replaced
+        with open(self.get_path("index.tmp"), "w+b") as file:
+            file.truncate(INDEX_HEADER.size + slots * INDEX_SLOT.size)
+            index = mmap.mmap(file.fileno(), 0)
+        INDEX_HEADER.pack_into(index, 0, INDEX_MAGIC, 0, slots, 0, segment, end)
+        return index
+
+    def recover(self) -> None:
+        if not os.path.exists(self.get_path("index")):
+            self.create_index(INDEX_INITIAL_SLOTS, 0, 0).close()
+            os.replace(self.get_path("index.tmp"), self.get_path("index"))
+
+        _, _, _, _, segment, end = INDEX_HEADER.unpack_from(self.get_index())
+        segment_path = self.get_segment_path(segment)
+        if os.path.exists(segment_path) and os.path.getsize(segment_path) > end:
+            # a writer stopped before it committed its records
+            logger.warning("Truncating torn tail of %s to %d bytes", segment_path, end)
+            os.truncate(segment_path, end)
+
+    def get_index(self) -> mmap.mmap:
+        with self.index_lock:
+            if self.index is None or INDEX_HEADER.unpack_from(self.index)[1]:
+                with open(self.get_path("index"), "r+b") as file:
+                    self.index = mmap.mmap(file.fileno(), 0)
+            return self.index
+
+    def grow_index(self, index: mmap.mmap, slots: int) -> mmap.mmap:
+        _, _, previous_slots, used, segment, end = INDEX_HEADER.unpack_from(index)
+        grown = self.create_index(slots, segment, end)
+        for position in range(INDEX_HEADER.size, len(index), INDEX_SLOT.size):
+            digest, record_segment, offset = INDEX_SLOT.unpack_from(index, position)
+            if digest:
+                insert_slot(grown, digest, record_segment, offset)
+        INDEX_HEADER.pack_into(grown, 0, INDEX_MAGIC, 0, slots, used, segment, end)
+        os.replace(self.get_path("index.tmp"), self.get_path("index"))
+
+        # processes still reading the previous index map the new one on their next lookup
+        INDEX_HEADER.pack_into(index, 0, INDEX_MAGIC, 1, previous_slots, used, segment, end)
+        with self.index_lock:
+            self.index = grown
+        return grown
+
+    def get_segment_map(self, segment: int, end: int) -> Optional[mmap.mmap]:
+        segment_map = self.maps.get(segment)
+        if segment_map is None or len(segment_map) < end:
+            # the segment grew since it was mapped
+            segment_path = self.get_segment_path(segment)
+            if not os.path.exists(segment_path) or os.path.getsize(segment_path) < end:
+                return None
+            with open(segment_path, "rb") as file:
+                segment_map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.maps[segment] = segment_map
+        return segment_map
+
+    def read(self, key: bytes, segment: int, offset: int) -> Optional[bytes]:
+        segment_map = self.get_segment_map(segment, offset + RECORD.size)
+        if segment_map is None:
+            return None
+
+        checksum, key_length, value_length = RECORD.unpack_from(segment_map, offset)
+        start = offset + RECORD.size
+        segment_map = self.get_segment_map(segment, start + key_length + value_length)
+        # another key with the same digest, or a slot of records which were never committed
+        if segment_map is None or segment_map[start : start + key_length] != key:
+            return None
+
+        value = segment_map[start + key_length : start + key_length + value_length]
+        if get_checksum(key, value) != checksum:
+            logger.error("Corrupted record of %s in segment %d at %d", key.decode(), segment, offset)
+            return None
+        return value
+
+    def is_persisted(self, key: str) -> bool:
+        # compressed variants of entries are computed again from the entries
+        return key.startswith(self.prefixes) and VARIANT_SEPARATOR not in key
+
+    def get(self, key: str) -> Optional[bytes]:
+        if not self.is_persisted(key):
+            return None
+
+        index = self.get_index()
+        encoded_key = key.encode()
+        digest = get_digest(encoded_key)
+        for position in iter_slots(index, digest):
+            slot_digest, segment, offset = INDEX_SLOT.unpack_from(index, position)
+            if not slot_digest:
+                return None
+            if slot_digest == digest and (value := self.read(encoded_key, segment, offset)) is not None:
+                return value
+        return None
+
+    def put(self, entries: Sequence[Tuple[str, bytes]]) -> None:
+        with self.locked():
+            entries = [(key, value) for key, value in entries if self.is_persisted(key) and self.get(key) is None]
+            if not entries:
+                return
+
+            index = self.get_index()
+            _, _, slots, used, segment, end = INDEX_HEADER.unpack_from(index)
+            if end >= self.segment_size:
+                segment, end = segment + 1, 0
+
+            locations: List[Tuple[bytes, int]] = []
+            # written over the torn tail of a writer which stopped before it committed its records
+            with open(os.open(self.get_segment_path(segment), os.O_RDWR | os.O_CREAT, 0o644), "r+b") as file:
+                file.seek(end)
+                file.truncate()
+                for key, value in entries:
+                    encoded_key = key.encode()
+                    file.write(RECORD.pack(get_checksum(encoded_key, value), len(encoded_key), len(value)))
+                    file.write(encoded_key + value)
+                    locations.append((encoded_key, end))
+                    end += RECORD.size + len(encoded_key) + len(value)
+
+            if (used + len(locations)) * 2 > slots:
+                while (used + len(locations)) * 2 > slots:
+                    slots *= 2
+                index = self.grow_index(index, slots)
+            for encoded_key, offset in locations:
+                insert_slot(index, get_digest(encoded_key), segment, offset)
+            # records are complete and indexed before they are committed
+            INDEX_HEADER.pack_into(index, 0, INDEX_MAGIC, 0, slots, used + len(locations), segment, end)
+
+    def close(self) -> None:
+        for segment_map in self.maps.values():
+            segment_map.close()
+        self.maps.clear()
+        if self.index is not None:
+            self.index.close()
+            self.index = None
+
+
+BLOCK_STORE: Optional[BlockStore] = None
+
+
+def open_block_store(prefixes: Sequence[str]) -> None:
+    global BLOCK_STORE  # pylint: disable=global-statement
+    if CONFIG.block_store_path:
+        BLOCK_STORE = BlockStore(CONFIG.block_store_path, CONFIG.block_store_segment_size, prefixes)
+
+
+def close_block_store() -> None:
+    global BLOCK_STORE  # pylint: disable=global-statement
+    if BLOCK_STORE is not None:
+        BLOCK_STORE.close()
+        BLOCK_STORE = None
+
+
+def is_block_store_open() -> bool:
+    return BLOCK_STORE is not None
+
+
+async def read_from_block_store(key: str) -> Optional[bytes]:
+    if BLOCK_STORE is None or not BLOCK_STORE.is_persisted(key):
+        return None
+    # segments which are not in the page cache are read from the disk, which must not block the event loop
+    return await asyncio.to_thread(BLOCK_STORE.get, key)
+
+
+async def write_to_block_store(entries: Sequence[Tuple[str, bytes]]) -> None:
+    if BLOCK_STORE is not None:
+        await asyncio.to_thread(BLOCK_STORE.put, entries)
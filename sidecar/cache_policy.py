@@ -0,0 +1,37 @@
+from typing import Optional
+
+from genesis.logging import logger
+from genesis.models import PlainBlock
+
+from sidecar.config import CONFIG
+from sidecar.tip import TIP, get_tip_height
+
+
+async def get_depth(height: int) -> Optional[int]:
+    # an outdated tip only makes blocks look closer to it, known height is used without asking the node again
+    tip_height = TIP.height
+    if tip_height is None:
+        try:
+            tip_height = await get_tip_height()
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Unable to get tip height for cache expiry")
+            return None
+
+    return tip_height - height
+
+
+async def get_block_depth(block: PlainBlock) -> Optional[int]:
+    return await get_depth(block.height)
+
+
+def is_block_confirmed(depth: Optional[int]) -> bool:
+    return depth is not None and depth >= CONFIG.confirmations
+
+
+def get_block_ttl(depth: Optional[int], seconds: int) -> int:
+    # Blocks close to the tip can be replaced by a reorg and expire soon,
+    # deeply confirmed blocks do not change and are kept much longer, 0 keeps them without expiry.
+    if not is_block_confirmed(depth):
+        return min(seconds, CONFIG.cache_ttl_near_tip)
+
+    return CONFIG.cache_ttl_confirmed
@@ -1,15 +1,99 @@
 import asyncio
-from functools import wraps
-from typing import Any, Callable
-from uuid import uuid4
+import hashlib
+import inspect
+from dataclasses import dataclass
+from functools import partial, wraps
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
+import orjson
+from fastapi import HTTPException, Request, status
 from fastapi.responses import Response
-from genesis.encoders import fast_serializer_to_bytes
 from genesis.logging import logger
-from genesis.profiling import log_duration
 
-from sidecar.async_utils import create_task_safely
+from sidecar.async_utils import IN_FLIGHT, create_task_safely, share_in_flight
+from sidecar.block_store import (
+    is_block_store_open,
+    read_from_block_store,
+    write_to_block_store,
+)
+from sidecar.compression import (
+    HTTP_ENCODINGS,
+    VARIANT_SEPARATOR,
+    choose_response_encoding,
+    compress_value,
+    decompress,
+    decompress_value,
+    encode_response,
+    get_accepted_encodings,
+    split_value,
+)
 from sidecar.config import CONFIG, REDIS
+from sidecar.executor import serialize
+from sidecar.memory_cache import MemoryCache
+from sidecar.metrics import Counter, Gauge, Histogram, should_profile
+from sidecar.redis_utils import run_script
+from sidecar.tip import TIP
+
+# depth of a fetched response below the tip, None when it is not known
+DepthPolicy = Callable[[Any], Awaitable[Optional[int]]]
+# computes expiry of a fetched response from its depth and the default expiry
+TTLPolicy = Callable[[Optional[int], int], int]
+# entries stored together with a fetched response, key -> stored value
+RelatedEntries = Sequence[Tuple[str, bytes]]
+# computes entries of other routes which can be answered from a fetched response stored under the key
+Indexer = Callable[[str, Any], Awaitable[RelatedEntries]]
+# tells from its depth whether a fetched response does not change anymore and can be kept on the disk
+PersistPolicy = Callable[[Optional[int]], bool]
+
+# value of an entry answered by another key, the hash of the block it was made for and the key follow the marker
+ALIAS_MARKER = b"\x00"
+# value of an entry remembering the route found nothing, the status code and the tip height follow the marker
+NEGATIVE_MARKER = b"\x03"
+NEGATIVE_STATUS_CODES = (status.HTTP_404_NOT_FOUND, status.HTTP_204_NO_CONTENT)
+
+MEMORY_CACHE = MemoryCache(max_size=CONFIG.memory_cache_size, max_item_size=CONFIG.memory_cache_item_size)
+
+REQUESTS_IN_PROGRESS = Gauge("sidecar_cache_requests_in_progress", "Requests being served by cache_response")
+COALESCED_CALLS_IN_PROGRESS = Gauge(
+    "sidecar_cache_coalesced_calls_in_progress",
+    "Calls shared by concurrent cache misses",
+    function=lambda: len(IN_FLIGHT),
+)
+CACHE_HITS_MEMORY = Counter("sidecar_cache_hits_total", "Responses served from cache", {"tier": "memory"})
+CACHE_HITS_REDIS = Counter("sidecar_cache_hits_total", "Responses served from cache", {"tier": "redis"})
+CACHE_HITS_DISK = Counter("sidecar_cache_hits_total", "Responses served from cache", {"tier": "disk"})
+CACHE_HITS_STALE = Counter("sidecar_cache_stale_hits_total", "Expired responses served while being refreshed")
+CACHE_HITS_NEGATIVE = Counter("sidecar_cache_negative_hits_total", "Missing data answered from cache")
+# a memory miss falls through to redis and the disk, a miss of all tiers to the node
+CACHE_MISSES_MEMORY = Counter("sidecar_cache_misses_total", "Responses not found in cache", {"tier": "memory"})
+CACHE_MISSES = Counter("sidecar_cache_misses_total", "Responses not found in cache", {"tier": "all"})
+REDIS_GET_DURATION = Histogram("sidecar_cache_redis_duration_seconds", "Duration of redis commands", {"command": "get"})
+REDIS_SET_DURATION = Histogram(
+    "sidecar_cache_redis_duration_seconds", "Duration of redis commands", {"command": "setex"}
+)
+NODE_CALL_DURATION = Histogram("sidecar_cache_node_call_duration_seconds", "Duration of fetching and decoding data")
+SERIALIZATION_DURATION = Histogram("sidecar_cache_serialization_duration_seconds", "Duration of response serialization")
+ENCODING_DURATION = Histogram("sidecar_cache_encoding_duration_seconds", "Duration of computing compressed responses")
+CACHE_NOT_MODIFIED = Counter("sidecar_cache_not_modified_total", "Responses answered with 304 Not Modified")
+MEMORY_CACHE_SIZE = Gauge(
+    "sidecar_memory_cache_bytes", "Size of values in memory cache", function=lambda: MEMORY_CACHE.size
+)
+MEMORY_CACHE_ITEMS = Gauge(
+    "sidecar_memory_cache_items", "Number of values in memory cache", function=lambda: len(MEMORY_CACHE)
+)
+MEMORY_CACHE_EVICTIONS = Counter(
+    "sidecar_memory_cache_evictions_total", "Values evicted from memory cache", function=lambda: MEMORY_CACHE.evictions
+)
 
 
 def get_method_signature(func: Callable, args: Any, kwargs: Any) -> str:
@@ -24,46 +108,494 @@ def get_cache_key(signature: str) -> str:
     return f"{CONFIG.node_blockchain.blockchain_name}/cache/{signature}"
 
 
-async def store_response(key: str, seconds: int, serialized: bytes) -> None:
-    await REDIS.setex(key, seconds, serialized)
+def get_lock_key(key: str) -> str:
+    return f"{key}/lock"
+
+
+class Alias(NamedTuple):
+    key: str
+    block_hash: str
+
+
+def make_alias(key: str, block_hash: str) -> bytes:
+    return ALIAS_MARKER + f"{block_hash} {key}".encode()
+
+
+def get_alias(value: bytes) -> Optional[Alias]:
+    if value[:1] != ALIAS_MARKER:
+        return None
+    block_hash, _, key = value[1:].decode().partition(" ")
+    return Alias(key, block_hash)
+
+
+def resolve_alias(alias: Alias, value: Optional[bytes]) -> Optional[bytes]:
+    # after a reorg the key can hold another block, an alias made for the previous one is a miss
+    if value is None or is_negative(value) or orjson.loads(decompress_value(value)).get("hash") != alias.block_hash:
+        return None
+    return value
+
+
+def get_aliases_key(key: str) -> str:
+    return f"{key}/aliases"
+
+
+def make_negative(status_code: int) -> bytes:
+    tip_height = -1 if TIP.height is None else TIP.height
+    return NEGATIVE_MARKER + f"{status_code}:{tip_height}".encode()
+
+
+def is_negative(value: bytes) -> bool:
+    return value[:1] == NEGATIVE_MARKER
+
+
+def is_negative_valid(value: bytes) -> bool:
+    # the data can appear in the next block, e.g. a future height or a transaction being confirmed,
+    # so the entry is valid only until the tip advances
+    tip_height = int(value[1:].split(b":")[1])
+    return TIP.height is None or TIP.height <= tip_height
+
+
+def raise_if_negative(value: bytes) -> None:
+    if is_negative(value):
+        raise HTTPException(status_code=int(value[1:].split(b":")[0]))
+
+
+async def store_response(key: str, seconds: int, serialized: bytes, related: RelatedEntries = ()) -> None:
+    with REDIS_SET_DURATION.time():
+        async with REDIS.pipeline(transaction=False) as pipe:
+            for entry_key, value in [(key, serialized), *related]:
+                # deeply confirmed data does not change, 0 keeps it until evicted
+                pipe.set(entry_key, value, ex=seconds or None)
+            await pipe.execute()
+
+
+# Extends expiry of the keys to ARGV[1] seconds, keys with a longer or no expiry are left alone.
+# KEYS[1] is an entry and the rest its variants, an alias expires together with the entry it points to
+# and neither it nor its variants are extended.
+EXTEND_EXPIRY_SCRIPT = """
+if redis.call('GETRANGE', KEYS[1], 0, 0) == '\\0' then
+    return 0
+end
+for _, key in ipairs(KEYS) do
+    local ttl = redis.call('TTL', key)
+    if ttl >= 0 and ttl < tonumber(ARGV[1]) then
+        redis.call('EXPIRE', key, ARGV[1])
+    end
+end
+return 0
+"""
+
+
+async def extend_expiry(*keys: str, seconds: int) -> None:
+    await run_script(REDIS, EXTEND_EXPIRY_SCRIPT, keys=list(keys), args=[seconds])
+
+
+async def wait_for_other_replica(key: str) -> Optional[bytes]:
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + CONFIG.cache_lock_timeout
+    lock_key = get_lock_key(key)
+
+    while loop.time() < deadline:
+        await asyncio.sleep(CONFIG.cache_lock_poll_interval)
+        # the other replica may have stored an alias or a negative entry, resolved as on a hit
+        cached = await get_cached(key, immutable=False, profiling=False)
+        if cached.value:
+            return cached.value
+
+        if not await REDIS.exists(lock_key):
+            return None
+
+    return None
+
+
+class Fetched(NamedTuple):
+    value: bytes
+    seconds: int
+    related: RelatedEntries
+    persistent: bool = False
+
+
+class Served(NamedTuple):
+    value: bytes
+    stale: bool = False
+    # expiry the entry was stored with when it was fetched for the request, None when it was found in the cache
+    seconds: Optional[int] = None
+
+
+@dataclass(frozen=True)
+class CachePolicy:
+    # expiry of fetched responses
+    seconds: int
+    # computed once per fetched response and passed to ttl and persist
+    depth: Optional[DepthPolicy] = None
+    # computes expiry of a fetched response, 0 stores it without expiry
+    ttl: Optional[TTLPolicy] = None
+    # computes entries of other routes stored together with a fetched response
+    index: Optional[Indexer] = None
+    # tells whether a fetched response is also written to the block store on the disk
+    persist: Optional[PersistPolicy] = None
+
+
+async def call_and_serialize(key: str, func: Callable, args: Any, kwargs: Any, policy: CachePolicy) -> Fetched:
+    try:
+        with NODE_CALL_DURATION.time():
+            response = await func(*args, **kwargs)
+    except HTTPException as exc:
+        if exc.status_code not in NEGATIVE_STATUS_CODES or not CONFIG.cache_negative_ttl:
+            raise
+        # clients probing missing data are answered from the cache
+        return Fetched(make_negative(exc.status_code), CONFIG.cache_negative_ttl, [])
+
+    depth = await policy.depth(response) if policy.depth is not None else None
+    seconds = policy.ttl(depth, policy.seconds) if policy.ttl is not None else policy.seconds
+    with SERIALIZATION_DURATION.time():
+        # values are kept in the format they are stored in redis, compressed when enabled
+        value = compress_value(await serialize(response))
+        related = await policy.index(key, response) if policy.index is not None else []
+    return Fetched(
+        value, seconds, related, policy.persist is not None and is_block_store_open() and policy.persist(depth)
+    )
+
+
+def get_stored_seconds(seconds: int) -> int:
+    # entries are kept for cache_stale_ttl seconds after they expire to be served while they are refreshed
+    return seconds + CONFIG.cache_stale_ttl if seconds else 0
+
+
+async def delete_replaced_aliases(key: str, seconds: int, related: RelatedEntries) -> None:
+    # keys of aliases pointing to an entry are kept next to it, aliases of a block replaced by a reorg are deleted
+    aliases = [entry_key for entry_key, value in related if get_alias(value)]
+    if not aliases:
+        return
+
+    async with REDIS.pipeline(transaction=True) as pipe:
+        pipe.getset(get_aliases_key(key), "\n".join(aliases))
+        if seconds:
+            pipe.expire(get_aliases_key(key), seconds)
+        previous, *_ = await pipe.execute()
+    replaced = set(previous.decode().split("\n")) - set(aliases) if previous else set()
+    if replaced:
+        await REDIS.delete(*replaced)
+
+
+def get_fetched_seconds(fetched: Fetched) -> int:
+    return fetched.seconds if is_negative(fetched.value) else get_stored_seconds(fetched.seconds)
+
+
+async def store_fetched(key: str, fetched: Fetched) -> None:
+    seconds = get_fetched_seconds(fetched)
+    await store_response(key, seconds, fetched.value, fetched.related)
+    await delete_replaced_aliases(key, seconds, fetched.related)
+    if fetched.persistent:
+        await write_to_block_store([(key, fetched.value), *fetched.related])
+
+
+async def call_and_store_locked(key: str, fetch: Callable[[], Awaitable[Fetched]]) -> Served:
+    lock_key = get_lock_key(key)
+    acquired = await REDIS.set(lock_key, 1, nx=True, px=int(CONFIG.cache_lock_timeout * 1000))
+
+    if not acquired:
+        cached = await wait_for_other_replica(key)
+        if cached:
+            logger.info("Cache filled by another replica: %s", key)
+            return Served(cached)
+
+    try:
+        fetched = await fetch()
+        # stored before releasing the lock so replicas waiting for it find the value
+        await store_fetched(key, fetched)
+        return Served(fetched.value, seconds=get_fetched_seconds(fetched))
+    finally:
+        if acquired:
+            await REDIS.delete(lock_key)
+
+
+async def call_coalesced(key: str, fetch: Callable[[], Awaitable[Fetched]]) -> Served:
+    if CONFIG.cache_lock_enabled:
+        return await call_and_store_locked(key, fetch)
+
+    fetched = await fetch()
+    create_task_safely(store_fetched(key, fetched))
+    return Served(fetched.value, seconds=get_fetched_seconds(fetched))
+
 
+async def resolve_aliases(cached: List[Optional[bytes]], indexes: List[int]) -> None:
+    aliases = {}
+    for index in indexes:
+        if (value := cached[index]) is not None and (alias := get_alias(value)):
+            aliases[index] = alias
+    if not aliases:
+        return
 
-async def extend_expiry(key: str, seconds: int) -> None:
-    await REDIS.expire(key, seconds)
+    with REDIS_GET_DURATION.time():
+        targets = await REDIS.mget([alias.key for alias in aliases.values()])
+    for (index, alias), value in zip(aliases.items(), targets):
+        cached[index] = resolve_alias(alias, value)
 
 
-def cache_response(seconds: int, extend_life_on_hit: bool = True) -> Callable:
+async def get_cached_many(keys: List[str], immutable: bool = False) -> List[Optional[bytes]]:
+    cached = [MEMORY_CACHE.get(key) if immutable else None for key in keys]
+    if immutable:
+        hits = sum(1 for value in cached if value)
+        CACHE_HITS_MEMORY.inc(hits)
+        CACHE_MISSES_MEMORY.inc(len(keys) - hits)
+
+    missing = [index for index, value in enumerate(cached) if not value]
+    if missing:
+        with REDIS_GET_DURATION.time():
+            values = await REDIS.mget([keys[index] for index in missing])
+        for index, value in zip(missing, values):
+            cached[index] = value
+        CACHE_HITS_REDIS.inc(sum(1 for value in values if value))
+
+        await resolve_aliases(cached, missing)
+
+        for index in missing:
+            if not cached[index] and (value := await read_from_block_store(keys[index])):
+                alias = get_alias(value)
+                cached[index] = resolve_alias(alias, await read_from_block_store(alias.key)) if alias else value
+                CACHE_HITS_DISK.inc()
+
+        # missing items are requested from the route which answers them from the negative entry
+        for index in missing:
+            if (value := cached[index]) is not None and is_negative(value):
+                cached[index] = None
+
+    return [decompress_value(value) if value else value for value in cached]
+
+
+def json_response(serialized: bytes, headers: Optional[Dict[str, str]] = None) -> Response:
+    # bytes are returned as they are, FastAPI neither validates them against response_model nor serializes them again
+    return Response(content=serialized, media_type="application/json", headers=headers)
+
+
+def cached_response(value: bytes, request: Optional[Request], headers: Dict[str, str]) -> Response:
+    encoding, payload = split_value(value)
+    if encoding in HTTP_ENCODINGS and request is not None:
+        if encoding in get_accepted_encodings(request.headers.get("accept-encoding")):
+            # compressed bytes are sent as they are, the client decompresses them
+            return json_response(payload, headers={**headers, "Content-Encoding": encoding})
+
+    return json_response(decompress(encoding, payload), headers=headers)
+
+
+def get_variant_key(key: str, encoding: str) -> str:
+    return f"{key}{VARIANT_SEPARATOR}{encoding}"
+
+
+def get_etag(key: str) -> str:
+    # immutable responses never change, the key identifies their content
+    # weak because the representation differs with Content-Encoding
+    return f'W/"{hashlib.blake2b(key.encode(), digest_size=16).hexdigest()}"'
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+
+    return etag[2:] in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+
+
+def get_response_encoding(request: Optional[Request]) -> Optional[str]:
+    if request is None or not CONFIG.response_compression:
+        return None
+
+    return choose_response_encoding(request.headers.get("accept-encoding"), CONFIG.cache_compression)
+
+
+class Cached(NamedTuple):
+    value: Optional[bytes]
+    # Expiry of the key can be extended. It can not for memory hits, which do not touch redis,
+    # and for aliases, which expire together with the entry they point to.
+    extendable: bool = True
+    # past its expiry, kept for cache_stale_ttl seconds to be served while it is refreshed
+    stale: bool = False
+
+
+async def get_stored(key: str, profiling: bool) -> Tuple[Optional[bytes], bool]:
+    with REDIS_GET_DURATION.time(f"profiling: {key}: REDIS.get" if profiling else None):
+        if not CONFIG.cache_stale_ttl:
+            value, ttl = await REDIS.get(key), -1
+        else:
+            async with REDIS.pipeline(transaction=False) as pipe:
+                value, ttl = await pipe.get(key).ttl(key).execute()
+
+    if value:
+        if not get_alias(value):
+            CACHE_HITS_REDIS.inc()
+        return value, 0 <= ttl < CONFIG.cache_stale_ttl
+
+    # values on the disk do not expire, they are deeply confirmed
+    value = await read_from_block_store(key)
+    if value and not get_alias(value):
+        CACHE_HITS_DISK.inc()
+    return value, False
+
+
+async def get_cached(key: str, immutable: bool, profiling: bool) -> Cached:
+    if immutable:
+        if value := MEMORY_CACHE.get(key):
+            CACHE_HITS_MEMORY.inc()
+            return Cached(value, extendable=False)
+        CACHE_MISSES_MEMORY.inc()
+
+    value, stale = await get_stored(key, profiling)
+    extendable = True
+    if value and (alias := get_alias(value)):
+        extendable = False
+        value, stale = await get_stored(alias.key, profiling)
+        value = resolve_alias(alias, value)
+
+    if value and is_negative(value):
+        # negative entries are short lived, they are neither extended nor refreshed nor kept in memory
+        if not is_negative_valid(value):
+            return Cached(None)
+        CACHE_HITS_NEGATIVE.inc()
+        return Cached(value, extendable=False)
+
+    if value:
+        if immutable:
+            MEMORY_CACHE.set(key, value)
+    return Cached(value, extendable, stale)
+
+
+def get_refresh_key(key: str) -> str:
+    return f"{key}/refresh"
+
+
+async def refresh_stale(key: str, fetch: Callable[[], Awaitable[Fetched]]) -> None:
+    # one replica refreshes the entry at a time so a node which is down is not flooded
+    if not await REDIS.set(get_refresh_key(key), 1, nx=True, ex=CONFIG.cache_stale_refresh_interval):
+        return
+
+    try:
+        await share_in_flight(key, lambda: call_coalesced(key, fetch))
+    except Exception as exc:  # pylint: disable=broad-except
+        logger.info("Refreshing stale %s failed: %r", key, exc)
+        return
+
+    # compressed variants are computed again from the new value
+    if CONFIG.response_compression:
+        await REDIS.delete(*[get_variant_key(key, encoding) for encoding in CONFIG.response_compression])
+
+
+async def encode_and_store(key: str, seconds: int, encoding: str, value: bytes) -> bytes:
+    with ENCODING_DURATION.time():
+        # zlib and brotli release the GIL, the event loop keeps serving other requests
+        encoded = await asyncio.to_thread(encode_response, decompress_value(value), encoding)
+
+    # The variant expires together with the entry it was computed from. -1 is an entry without expiry,
+    # -2 an entry which is not in redis and 0 an entry expiring in less than a second, which must not be kept forever.
+    ttl = await REDIS.ttl(key)
+    create_task_safely(
+        store_response(get_variant_key(key, encoding), {-1: 0, -2: seconds, 0: 1}.get(ttl, ttl), encoded)
+    )
+    return encoded
+
+
+# Request of the client is passed by FastAPI to decorated routes to choose Content-Encoding of the response.
+# Internal callers do not pass it and always get uncompressed JSON.
+REQUEST_PARAMETER = inspect.Parameter("http_request", inspect.Parameter.KEYWORD_ONLY, annotation=Request)
+
+
+class CachedRoute:
+    def __init__(self, func: Callable, policy: CachePolicy, extend_life_on_hit: bool, immutable: bool) -> None:
+        self.func = func
+        self.policy = policy
+        self.extend_life_on_hit = extend_life_on_hit
+        # immutable responses are additionally kept in the memory of the worker and served without touching redis
+        self.immutable = immutable
+
+    def get_fetch(self, key: str, args: Any, kwargs: Any) -> Callable[[], Awaitable[Fetched]]:
+        return partial(call_and_serialize, key, self.func, args, kwargs, self.policy)
+
+    def on_hit(self, cached: Cached, key: str, fetch: Callable[[], Awaitable[Fetched]], *other_keys: str) -> None:
+        if cached.stale:
+            CACHE_HITS_STALE.inc()
+            create_task_safely(refresh_stale(key, fetch))
+        elif self.extend_life_on_hit and cached.extendable:
+            create_task_safely(extend_expiry(key, *other_keys, seconds=get_stored_seconds(self.policy.seconds)))
+
+    async def get_value(self, key: str, fetch: Callable[[], Awaitable[Fetched]], profiling: bool) -> Served:
+        cached = await get_cached(key, self.immutable, profiling)
+        if cached.value is not None:
+            raise_if_negative(cached.value)
+            self.on_hit(cached, key, fetch)
+            return Served(cached.value, cached.stale)
+
+        CACHE_MISSES.inc()
+        if profiling:
+            logger.info("Cache miss: %s", key)
+
+        served: Served = await share_in_flight(key, lambda: call_coalesced(key, fetch))
+        raise_if_negative(served.value)
+        if self.immutable:
+            MEMORY_CACHE.set(key, served.value)
+        return served
+
+    async def get_variant(
+        self, key: str, encoding: str, fetch: Callable[[], Awaitable[Fetched]], profiling: bool
+    ) -> Served:
+        # compressed once per cache entry and shared by all clients accepting the encoding
+        variant_key = get_variant_key(key, encoding)
+        cached = await get_cached(variant_key, self.immutable, profiling)
+        if cached.value is not None:
+            self.on_hit(cached, key, fetch, variant_key)
+            return Served(cached.value, cached.stale)
+
+        base = await self.get_value(key, fetch, profiling)
+        # A fetched entry may not be in redis yet, its variant expires as computed for the entry.
+        # Entries missing in redis but found in memory or on the disk are immutable or deeply confirmed.
+        seconds = base.seconds if base.seconds is not None else get_stored_seconds(self.policy.seconds)
+        variant = await share_in_flight(variant_key, lambda: encode_and_store(key, seconds, encoding, base.value))
+        if self.immutable:
+            MEMORY_CACHE.set(variant_key, variant)
+        return Served(variant, base.stale)
+
+    async def get_response(
+        self, key: str, fetch: Callable[[], Awaitable[Fetched]], request: Optional[Request], headers: Dict[str, str]
+    ) -> Response:
+        # per request logging is costly, only a sample of requests is profiled
+        profiling = should_profile(CONFIG.profiling_sample_rate)
+        encoding = get_response_encoding(request)
+        if encoding:
+            served = await self.get_variant(key, encoding, fetch, profiling)
+            headers = {**headers, "Content-Encoding": encoding}
+        else:
+            served = await self.get_value(key, fetch, profiling)
+
+        if served.stale:
+            headers = {**headers, "X-Cache-Stale": "true"}
+        if encoding:
+            return json_response(served.value, headers=headers)
+        return cached_response(served.value, request, headers)
+
+    async def __call__(self, args: Any, kwargs: Any, request: Optional[Request]) -> Response:
+        key = get_cache_key(get_method_signature(self.func, args, kwargs))
+        headers = {"Vary": "Accept-Encoding"}
+        if self.immutable:
+            headers["ETag"] = get_etag(key)
+            if request is not None and is_not_modified(request, headers["ETag"]):
+                CACHE_NOT_MODIFIED.inc()
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        with REQUESTS_IN_PROGRESS.track_in_progress():
+            return await self.get_response(key, self.get_fetch(key, args, kwargs), request, headers)
+
+
+def cache_response(policy: CachePolicy, extend_life_on_hit: bool = True, immutable: bool = False) -> Callable:
     def wrapper(func: Callable) -> Callable:
+        route = CachedRoute(func, policy, extend_life_on_hit, immutable)
+
         @wraps(func)
-        async def inner(*args: Any, **kwargs: Any) -> Any:
-            signature = get_method_signature(func, args, kwargs)
-            key = get_cache_key(signature)
-            request_id = f"{signature}#{str(uuid4())}"
-            with log_duration(f"profiling: {request_id}: whole"):
-                logger.info("Active tasks count: %d", len([task for task in asyncio.all_tasks() if not task.done()]))
-
-                with log_duration(f"profiling: {request_id}: inner: REDIS.get"):
-                    response = await REDIS.get(key)
-
-                if response:
-                    if extend_life_on_hit:
-                        with log_duration(f"profiling: {request_id}: inner: REDIS.expire"):
-                            create_task_safely(extend_expiry(key, seconds))
-                    logger.info("Cache hit: %s", key)
-                    with log_duration(f"profiling: {request_id}: inner: returning cached response"):
-                        return Response(content=response, media_type="application/json")
-
-                logger.info("Cache miss: %s", key)
-                with log_duration(f"profiling: {request_id}: inner: call real function"):
-                    response = await func(*args, **kwargs)
-
-                with log_duration(f"profiling: {request_id}: inner: fast serializer"):
-                    serialized = fast_serializer_to_bytes(response.dict())
-
-                with log_duration(f"profiling: {request_id}: inner: REDIS.setex"):
-                    create_task_safely(store_response(key, seconds, serialized))
-                return response
+        async def inner(*args: Any, http_request: Optional[Request] = None, **kwargs: Any) -> Response:
+            return await route(args, kwargs, http_request)
 
+        signature = inspect.signature(func)
+        inner.__signature__ = signature.replace(  # type: ignore[attr-defined]
+            parameters=[*signature.parameters.values(), REQUEST_PARAMETER]
+        )
         return inner
 
     return wrapper
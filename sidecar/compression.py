@@ -0,0 +1,103 @@
+import gzip
+from typing import List, Optional, Tuple
+
+from sidecar.config import CONFIG
+
+try:
+    import zstandard
+
+    ZSTANDARD_AVAILABLE = True
+except ImportError:
+    ZSTANDARD_AVAILABLE = False
+
+try:
+    import lz4.frame
+
+    LZ4_AVAILABLE = True
+except ImportError:
+    LZ4_AVAILABLE = False
+
+try:
+    import brotli
+
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+# Compressed cache values are prefixed by a marker byte of the algorithm.
+# Uncompressed values, including those stored before compression was enabled, are plain JSON.
+MARKERS = {"zstd": b"\x01", "lz4": b"\x02"}
+ENCODINGS = {marker: encoding for encoding, marker in MARKERS.items()}
+# algorithms which are also HTTP content codings, their bytes can be sent to clients as they are
+HTTP_ENCODINGS = {"zstd"}
+# separates the key of a cache entry from the encoding of its compressed response variant
+VARIANT_SEPARATOR = "|"
+
+if CONFIG.cache_compression == "zstd" and not ZSTANDARD_AVAILABLE:
+    raise RuntimeError("cache_compression=zstd requires the zstandard package")
+if CONFIG.cache_compression == "lz4" and not LZ4_AVAILABLE:
+    raise RuntimeError("cache_compression=lz4 requires the lz4 package")
+if "br" in CONFIG.response_compression and not BROTLI_AVAILABLE:
+    raise RuntimeError("response_compression=br requires the brotli package")
+
+
+def compress_value(serialized: bytes) -> bytes:
+    encoding = CONFIG.cache_compression
+    if encoding is None or len(serialized) < CONFIG.cache_compression_min_size:
+        return serialized
+
+    compressed: bytes
+    if encoding == "zstd":
+        compressed = zstandard.ZstdCompressor(level=CONFIG.cache_compression_level).compress(serialized)
+    else:
+        compressed = lz4.frame.compress(serialized)
+    return MARKERS[encoding] + compressed
+
+
+def split_value(value: bytes) -> Tuple[Optional[str], bytes]:
+    encoding = ENCODINGS.get(value[:1])
+    if encoding is None:
+        return None, value
+    return encoding, value[1:]
+
+
+def decompress(encoding: Optional[str], payload: bytes) -> bytes:
+    if encoding is None:
+        return payload
+    decompressed: bytes
+    if encoding == "zstd":
+        decompressed = zstandard.ZstdDecompressor().decompress(payload)
+    else:
+        decompressed = lz4.frame.decompress(payload)
+    return decompressed
+
+
+def decompress_value(value: bytes) -> bytes:
+    return decompress(*split_value(value))
+
+
+def get_accepted_encodings(accept_encoding: Optional[str]) -> List[str]:
+    accepted = []
+    for item in (accept_encoding or "").split(","):
+        encoding, _, parameters = item.strip().partition(";")
+        if not encoding or parameters.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.append(encoding.strip().lower())
+    return accepted
+
+
+def encode_response(serialized: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        compressed: bytes = brotli.compress(serialized, quality=CONFIG.response_compression_br_quality)
+        return compressed
+    return gzip.compress(serialized, compresslevel=CONFIG.response_compression_gzip_level)
+
+
+def choose_response_encoding(accept_encoding: Optional[str], stored_encoding: Optional[str]) -> Optional[str]:
+    accepted = get_accepted_encodings(accept_encoding)
+    if stored_encoding in HTTP_ENCODINGS and stored_encoding in accepted:
+        # the stored value itself is sent, nothing has to be encoded
+        return None
+
+    # the first of the configured encodings the client accepts
+    return next((encoding for encoding in CONFIG.response_compression if encoding in accepted), None)
@@ -1,4 +1,4 @@
-from typing import Optional, Set
+from typing import Dict, List, Literal, Optional, Set
 
 import aioredis
 from genesis.blockchain.adapter import NodeAdapter
@@ -12,15 +12,67 @@ class Settings(BaseSettings):
     node_url: AnyUrl
     node_token: str
     redis_host: str
+    redis_max_connections: int = 64
+    redis_pool_timeout: float = 5.0
+    redis_socket_timeout: Optional[float] = None
+    redis_socket_connect_timeout: Optional[float] = 1.0
+    redis_health_check_interval: int = 30
     limit_default: int = 10_000
     limit_interval: int = 60 * 60 * 24
+    limit_lease_size: int = 0
+    limit_lease_flush_interval: float = 1.0
     environment: str = "dev"
     adapter: Optional[NodeAdapter] = None
     parser: Optional[Parser] = None
     sidecar_token: Optional[str] = None
     sidecar_urls: Set[str] = set()
     sidecar_limit_sync_interval: int = 1_000
+    sidecar_limit_flush_interval: float = 1.0
+    sidecar_limit_sync_timeout: float = 5.0
     sentry_dsn: Optional[str] = None
+    profiling_sample_rate: float = 0.0
+    api_key_cache_ttl: float = 60
+    api_key_cache_negative_ttl: float = 10
+    api_key_cache_size: int = 100_000
+    cache_lock_enabled: bool = False
+    cache_lock_timeout: float = 5.0
+    cache_lock_poll_interval: float = 0.05
+    cache_stale_ttl: int = 0
+    cache_stale_refresh_interval: int = 5
+    cache_negative_ttl: int = 10
+    memory_cache_size: int = 128 * 1024 * 1024
+    memory_cache_item_size: int = 16 * 1024 * 1024
+    cache_compression: Optional[Literal["zstd", "lz4"]] = None
+    cache_compression_level: int = 3
+    cache_compression_min_size: int = 1024
+    response_compression: List[Literal["br", "gzip"]] = []
+    response_compression_gzip_level: int = 6
+    response_compression_br_quality: int = 5
+    node_concurrency: int = 64
+    node_concurrency_per_operation: Dict[str, int] = {}
+    node_queue_size: int = 256
+    node_overloaded_retry_after: int = 1
+    executor_processes: int = 0
+    executor_min_transactions: int = 1_000
+    tip_cache_ttl: float = 1.0
+    cache_confirmations: Dict[str, int] = {}
+    cache_confirmations_default: int = 64
+    cache_ttl_near_tip: int = 60
+    cache_ttl_confirmed: int = 30 * 24 * 60 * 60
+    block_store_path: Optional[str] = None
+    block_store_segment_size: int = 1024 * 1024 * 1024
+    batch_max_items: int = 100
+    batch_concurrency: int = 8
+    export_max_items: int = 100_000
+    export_window: int = 16
+    # seconds without a new tip after which the status is ko, 0 disables the check
+    status_max_tip_lag: float = 0
+    prefetch_enabled: bool = False
+    prefetch_interval: float = 1.0
+    prefetch_transactions: bool = False
+    prefetch_concurrency: int = 8
+    prefetch_max_blocks: int = 10
+    prefetch_claim_ttl: int = 60
 
     class Config:
         env_file = ".env"
@@ -30,10 +82,30 @@ class Settings(BaseSettings):
     def convert_node_blockchain(cls, value: str) -> Blockchain:
         return Blockchain.from_name(value)
 
+    @property
+    def confirmations(self) -> int:
+        # blocks at least this deep are not expected to be replaced by a reorg
+        return self.cache_confirmations.get(self.node_blockchain.blockchain_name, self.cache_confirmations_default)
+
     @property
     def api_key_hash(self) -> str:
         return f"{self.node_blockchain.blockchain_name}/api_keys"
 
+    @property
+    def api_key_channel(self) -> str:
+        return f"{self.node_blockchain.blockchain_name}/api_keys/changed"
+
 
 CONFIG = Settings()
-REDIS = aioredis.from_url(f"redis://{CONFIG.redis_host}")
+# requests wait up to redis_pool_timeout for a free connection instead of opening new ones under load
+REDIS = aioredis.Redis(
+    connection_pool=aioredis.BlockingConnectionPool.from_url(
+        f"redis://{CONFIG.redis_host}",
+        max_connections=CONFIG.redis_max_connections,
+        timeout=CONFIG.redis_pool_timeout,
+        socket_timeout=CONFIG.redis_socket_timeout,
+        socket_connect_timeout=CONFIG.redis_socket_connect_timeout,
+        socket_keepalive=True,
+        health_check_interval=CONFIG.redis_health_check_interval,
+    )
+)
@@ -0,0 +1,90 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
+
+from genesis.blockchain.factory import NodeAdapterFactory, ParserFactory
+from genesis.blockchain.parser import Parser
+from genesis.encoders import fast_serializer_to_bytes
+from genesis.models import PlainBlock
+from pydantic import BaseModel
+
+from sidecar.config import CONFIG
+from sidecar.node_limiter import limit_node_calls
+
+T = TypeVar("T")
+
+EXECUTOR: Optional[ProcessPoolExecutor] = None
+
+# loop and parser of a worker process
+WORKER_PARSER: Optional[Tuple[asyncio.AbstractEventLoop, Parser]] = None
+
+
+def start_executor() -> None:
+    global EXECUTOR  # pylint: disable=global-statement
+    if CONFIG.executor_processes:
+        EXECUTOR = ProcessPoolExecutor(max_workers=CONFIG.executor_processes)
+
+
+def stop_executor() -> None:
+    global EXECUTOR  # pylint: disable=global-statement
+    if EXECUTOR is not None:
+        EXECUTOR.shutdown(cancel_futures=True)
+        EXECUTOR = None
+
+
+def count_transactions(data: Any) -> int:
+    # cheap estimate of the work, raw blocks are dicts (bitcoin-like nodes use "tx"), decoded blocks are models
+    if isinstance(data, dict):
+        transactions = data.get("transactions", data.get("tx", ()))
+    else:
+        transactions = getattr(data, "transactions", ())
+    return len(transactions) if isinstance(transactions, list) else 0
+
+
+def should_offload(data: Any) -> bool:
+    return EXECUTOR is not None and count_transactions(data) >= CONFIG.executor_min_transactions
+
+
+async def run_in_executor(func: Callable[..., T], *args: Any) -> T:
+    return await asyncio.get_running_loop().run_in_executor(EXECUTOR, partial(func, *args))
+
+
+def get_worker_parser() -> Tuple[asyncio.AbstractEventLoop, Parser]:
+    global WORKER_PARSER  # pylint: disable=global-statement
+    if WORKER_PARSER is None:
+        # parsers are async and may call the node, every worker process needs its own loop and adapter
+        loop = asyncio.new_event_loop()
+        adapter = loop.run_until_complete(
+            NodeAdapterFactory.get_client(CONFIG.node_blockchain, url=CONFIG.node_url, token=CONFIG.node_token)
+        )
+        WORKER_PARSER = loop, loop.run_until_complete(ParserFactory.get_parser(CONFIG.node_blockchain, adapter))
+    return WORKER_PARSER
+
+
+def decode_block_in_worker(raw_block: Dict) -> PlainBlock:
+    loop, parser = get_worker_parser()
+    return loop.run_until_complete(parser.decode_block(raw_block))
+
+
+def serialize_in_worker(response: BaseModel) -> bytes:
+    serialized: bytes = fast_serializer_to_bytes(response.dict())
+    return serialized
+
+
+async def decode_block(raw_block: Dict) -> PlainBlock:
+    if should_offload(raw_block):
+        # Calls of the adapter of a worker process bypass the limiter of this process,
+        # every offloaded block takes a slot of the decode_block limit until it is decoded instead.
+        async with limit_node_calls("decode_block"):
+            return await run_in_executor(decode_block_in_worker, raw_block)
+
+    return await CONFIG.parser.decode_block(raw_block)
+
+
+async def serialize(response: BaseModel) -> bytes:
+    if should_offload(response):
+        # pickling the model to the worker costs about a quarter of serializing it on the loop
+        return await run_in_executor(serialize_in_worker, response)
+
+    return serialize_in_worker(response)
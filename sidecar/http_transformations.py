@@ -4,6 +4,9 @@ from fastapi import HTTPException, status
 from genesis.blockchain.exceptions import DoesNotExist, SkippedBlock, Unavailable
 from genesis.logging import logger
 
+from sidecar.config import CONFIG
+from sidecar.node_limiter import NodeOverloaded
+
 
 @contextmanager
 def transform_to_http_exception() -> None:
@@ -11,6 +14,11 @@ def transform_to_http_exception() -> None:
         yield
     except DoesNotExist as exc:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND) from exc
+    except NodeOverloaded as exc:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={"Retry-After": str(CONFIG.node_overloaded_retry_after)},
+        ) from exc
     except Unavailable as exc:
         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE) from exc
     except SkippedBlock as exc:
@@ -1,19 +1,31 @@
+import asyncio
 import math
-from typing import Optional, Tuple
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
 
 import aiohttp
 from fastapi import Depends, HTTPException, Request, status
 from genesis.logging import logger
 
-from sidecar.async_utils import create_task_safely
-from sidecar.auth import get_api_key_and_limit
+from sidecar.auth import (
+    cache_api_key_limit,
+    get_api_key,
+    get_api_key_and_limit,
+    is_api_key_cached,
+)
 from sidecar.config import CONFIG, REDIS
 from sidecar.models import Limit
+from sidecar.redis_utils import run_script
 
 
-async def rate_limiter(
-    request: Request, api_key_info: Tuple[Optional[str], float] = Depends(get_api_key_and_limit)
-) -> None:
+async def rate_limiter(request: Request, api_key: Optional[str] = Depends(get_api_key)) -> None:
+    if api_key and not is_api_key_cached(api_key) and await apply_api_key_limits(api_key):
+        return
+
+    await charge_limits(request, await get_api_key_and_limit(api_key), cost=1)
+
+
+async def charge_limits(request: Request, api_key_info: Tuple[Optional[str], float], cost: int) -> None:
     api_key, api_key_limit = api_key_info
     if api_key_limit == math.inf:
         logger.info("api_limits: %s: unlimited", api_key)
@@ -21,7 +33,10 @@ async def rate_limiter(
 
     client_ip = request.headers.get("x-real-ip", request.client.host)
     key = get_limits_key(api_key, client_ip, CONFIG.node_blockchain.blockchain_name)
-    await apply_limits(key, api_key_limit)
+    if cost == 1 and CONFIG.limit_lease_size and await apply_limits_leased(key, api_key_limit):
+        return
+
+    await apply_limits(key, api_key_limit, cost)
 
 
 def get_limits_key(api_key: Optional[str], client_ip: str, blockchain_name: str) -> str:
@@ -33,54 +48,248 @@ def get_limits_key(api_key: Optional[str], client_ip: str, blockchain_name: str)
     return template.format(type="ip", value=client_ip)
 
 
-async def apply_limits(key: str, max_limit: float) -> None:
-    current_usage = await REDIS.get(key)
-    logger.info("api_limits: %s, %s/%s", key, int(current_usage) if current_usage else 0, max_limit)
+class AppliedLimits(NamedTuple):
+    usage: int
+    # seconds until the window resets, only when rejected
+    retry_after: int
+    allowed: int
 
-    if current_usage is None:
-        await REDIS.set(key, 1, ex=CONFIG.limit_interval)
-        return
 
-    current_usage = int(current_usage)
+# Checks the limit, increases usage by ARGV[3] and sets expiry of a new window in a single round-trip.
+# Returns usage, seconds until the window resets (only when rejected) and whether the request is allowed.
+APPLY_LIMITS_SCRIPT = """
+local usage = tonumber(redis.call('GET', KEYS[1]) or '0')
+if usage + tonumber(ARGV[3]) > tonumber(ARGV[1]) then
+    return {usage, redis.call('TTL', KEYS[1]), 0}
+end
+
+usage = redis.call('INCRBY', KEYS[1], ARGV[3])
+if redis.call('TTL', KEYS[1]) < 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return {usage, -1, 1}
+"""
+
+
+# Looks up the limit of the api key ARGV[1] in KEYS[1] and applies it to KEYS[2] like APPLY_LIMITS_SCRIPT,
+# so requests with an api key which is not cached need a single round-trip.
+# Returns only the limit when the usage is not counted, empty for an invalid key.
+APPLY_API_KEY_LIMITS_SCRIPT = """
+local limit = redis.call('HGET', KEYS[1], ARGV[1])
+if not limit then
+    return {''}
+end
+
+local max_limit = tonumber(limit)
+if max_limit == nil or max_limit == math.huge then
+    return {limit}
+end
+
+local usage = tonumber(redis.call('GET', KEYS[2]) or '0')
+if usage + tonumber(ARGV[3]) > max_limit then
+    return {limit, usage, redis.call('TTL', KEYS[2]), 0}
+end
+
+usage = redis.call('INCRBY', KEYS[2], ARGV[3])
+if redis.call('TTL', KEYS[2]) < 0 then
+    redis.call('EXPIRE', KEYS[2], ARGV[2])
+end
+return {limit, usage, -1, 1}
+"""
+
+
+async def apply_api_key_limits(api_key: str) -> bool:
+    key = get_limits_key(api_key, "", CONFIG.node_blockchain.blockchain_name)
+    api_key_limit, *result = await run_script(
+        REDIS,
+        APPLY_API_KEY_LIMITS_SCRIPT,
+        keys=[CONFIG.api_key_hash, key],
+        args=[api_key, CONFIG.limit_interval, 1],
+    )
+    cache_api_key_limit(api_key, api_key_limit or None)
+    if not result:
+        # invalid and unlimited keys are handled from the cache
+        return False
+
+    check_limits(key, float(api_key_limit), 1, AppliedLimits(*result))
+    return True
 
-    if current_usage >= max_limit:
-        retry_after = await REDIS.ttl(key)
+
+async def apply_limits(key: str, max_limit: float, cost: int = 1) -> None:
+    result = await run_script(REDIS, APPLY_LIMITS_SCRIPT, keys=[key], args=[max_limit, CONFIG.limit_interval, cost])
+    check_limits(key, max_limit, cost, AppliedLimits(*result))
+
+
+def check_limits(key: str, max_limit: float, cost: int, applied: AppliedLimits) -> None:
+    logger.info("api_limits: %s, %s/%s", key, applied.usage, max_limit)
+
+    if not applied.allowed:
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            headers={"Retry-After": str(retry_after)},
+            headers={"Retry-After": str(applied.retry_after)},
+        )
+
+    queue_limit_consumption(key, previous_usage=applied.usage - cost, usage=applied.usage)
+
+
+class Lease:
+    def __init__(self, remaining: int, expires_at: float) -> None:
+        self.remaining = remaining
+        self.expires_at = expires_at
+
+    def is_valid(self) -> bool:
+        return self.remaining > 0 and time.monotonic() < self.expires_at
+
+
+# Quota reserved in redis by this worker, served from memory without any I/O.
+LEASES: Dict[str, Lease] = {}
+
+# Reserves ARGV[3] requests at once unless the reservation would exceed the limit.
+# Returns usage and seconds until the window resets, 0 when nothing was reserved.
+RESERVE_LEASE_SCRIPT = """
+local usage = tonumber(redis.call('GET', KEYS[1]) or '0')
+if usage + tonumber(ARGV[3]) > tonumber(ARGV[1]) then
+    return {usage, 0}
+end
+
+usage = redis.call('INCRBY', KEYS[1], ARGV[3])
+local ttl = redis.call('TTL', KEYS[1])
+if ttl < 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+    ttl = tonumber(ARGV[2])
+end
+return {usage, ttl}
+"""
+
+# Returns unused reservations, keys whose window already ended are left alone.
+RELEASE_LEASES_SCRIPT = """
+for i, key in ipairs(KEYS) do
+    if redis.call('TTL', key) > 0 then
+        redis.call('DECRBY', key, ARGV[i])
+    end
+end
+return 0
+"""
+
+
+def consume_lease(key: str) -> bool:
+    lease = LEASES.get(key)
+    if lease is None or not lease.is_valid():
+        return False
+
+    lease.remaining -= 1
+    return True
+
+
+async def apply_limits_leased(key: str, max_limit: float) -> bool:
+    if consume_lease(key):
+        return True
+
+    usage, ttl = await run_script(
+        REDIS, RESERVE_LEASE_SCRIPT, keys=[key], args=[max_limit, CONFIG.limit_interval, CONFIG.limit_lease_size]
+    )
+    logger.info("api_limits: %s, %s/%s, lease reserved: %s", key, usage, max_limit, bool(ttl))
+    if not ttl:
+        # close to the limit, every request has to be counted exactly
+        return False
+
+    remaining = CONFIG.limit_lease_size - 1
+    lease = LEASES.get(key)
+    if lease is not None and lease.is_valid():
+        remaining += lease.remaining
+
+    LEASES[key] = Lease(remaining=remaining, expires_at=time.monotonic() + ttl)
+    queue_limit_consumption(key, previous_usage=usage - CONFIG.limit_lease_size, usage=usage)
+
+    return True
+
+
+async def release_unused_leases() -> None:
+    unused = {key: lease.remaining for key, lease in LEASES.items() if lease.is_valid()}
+    LEASES.clear()
+    if not unused:
+        return
+
+    await run_script(REDIS, RELEASE_LEASES_SCRIPT, keys=list(unused.keys()), args=list(unused.values()))
+
+
+async def release_unused_leases_periodically() -> None:
+    while True:
+        await asyncio.sleep(CONFIG.limit_lease_flush_interval)
+        try:
+            await release_unused_leases()
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Releasing limit leases failed")
+
+
+# Consumption waiting to be sent to other sidecars, key -> value.
+PENDING_LIMIT_SYNC: Dict[str, int] = {}
+SYNC_SESSION: Optional[aiohttp.ClientSession] = None
+
+
+def queue_limit_consumption(key: str, previous_usage: int, usage: int) -> None:
+    # other sidecars are informed about consumption in steps of sidecar_limit_sync_interval
+    interval = CONFIG.sidecar_limit_sync_interval
+    value = (usage // interval - previous_usage // interval) * interval
+    if value and CONFIG.sidecar_urls:
+        PENDING_LIMIT_SYNC[key] = PENDING_LIMIT_SYNC.get(key, 0) + value
+
+
+def get_sync_session() -> aiohttp.ClientSession:
+    global SYNC_SESSION  # pylint: disable=global-statement
+    if SYNC_SESSION is None or SYNC_SESSION.closed:
+        SYNC_SESSION = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=CONFIG.sidecar_limit_sync_timeout))
+    return SYNC_SESSION
+
+
+async def close_sync_session() -> None:
+    if SYNC_SESSION is not None:
+        await SYNC_SESSION.close()
+
+
+async def send_limits(sidecar_url: str, limits: List[Dict]) -> None:
+    try:
+        response = await get_sync_session().post(
+            url=f"{sidecar_url}/limit",
+            json=limits,
+            headers={"Authorization": f"Bearer {CONFIG.sidecar_token}"},
+            raise_for_status=True,
+            allow_redirects=False,
         )
+        response.release()
+    except Exception:  # pylint: disable=broad-except
+        logger.exception("Syncing limits to %s failed", sidecar_url)
 
-    new_usage = await REDIS.incr(key)
 
-    if new_usage % CONFIG.sidecar_limit_sync_interval == 0:
-        create_task_safely(broadcast_limit_consumption(key))
+async def broadcast_limit_consumption() -> None:
+    if not PENDING_LIMIT_SYNC:
+        return
+
+    pending = dict(PENDING_LIMIT_SYNC)
+    PENDING_LIMIT_SYNC.clear()
+
+    async with REDIS.pipeline(transaction=False) as pipe:
+        for key in pending:
+            pipe.ttl(key)
+        ttls = await pipe.execute()
+
+    limits = [
+        Limit(key=key, value=value, ttl=ttl).dict()
+        for (key, value), ttl in zip(pending.items(), ttls)
+        # window has already ended, there is nothing to synchronize
+        if ttl > 0
+    ]
+    if not limits:
+        return
 
+    logger.info("Syncing %d limits to %d sidecars", len(limits), len(CONFIG.sidecar_urls))
+    await asyncio.gather(*[send_limits(sidecar_url, limits) for sidecar_url in CONFIG.sidecar_urls])
 
-async def broadcast_limit_consumption(redis_key: str) -> None:
-    current_ttl = await REDIS.ttl(redis_key)
 
-    for other_redis_url in CONFIG.sidecar_urls:
+async def broadcast_limit_consumption_periodically() -> None:
+    while True:
+        await asyncio.sleep(CONFIG.sidecar_limit_flush_interval)
         try:
-            async with aiohttp.ClientSession() as session:
-                logger.warning(
-                    "json %s",
-                    Limit(
-                        key=redis_key,
-                        value=CONFIG.sidecar_limit_sync_interval,
-                        ttl=current_ttl,
-                    ).dict(),
-                )
-                response = await session.post(
-                    url=f"{other_redis_url}/limit",
-                    json=Limit(
-                        key=redis_key,
-                        value=CONFIG.sidecar_limit_sync_interval,
-                        ttl=current_ttl,
-                    ).dict(),
-                    headers={"Authorization": f"Bearer {CONFIG.sidecar_token}"},
-                    raise_for_status=True,
-                    allow_redirects=False,
-                )
-                logger.warning("Response json %s:", await response.json())
+            await broadcast_limit_consumption()
         except Exception:  # pylint: disable=broad-except
-            logger.exception("Syncing limit failed")
+            logger.exception("Syncing limits failed")
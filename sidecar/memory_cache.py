@@ -0,0 +1,53 @@
+from collections import OrderedDict
+from typing import Generic, Optional, TypeVar
+
+V = TypeVar("V")
+
+
+class LRUCache(Generic[V]):
+    # least recently used items are evicted first once the size of all items exceeds max_size
+    def __init__(self, max_size: int, max_item_size: int = 1) -> None:
+        self.max_size = max_size
+        self.max_item_size = max_item_size
+        self.size = 0
+        self.evictions = 0
+        self._items: "OrderedDict[str, V]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def sizeof(self, value: V) -> int:  # pylint: disable=unused-argument
+        return 1
+
+    def get(self, key: str) -> Optional[V]:
+        value = self._items.get(key)
+        if value is not None:
+            self._items.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: V) -> None:
+        if self.sizeof(value) > min(self.max_item_size, self.max_size):
+            return
+
+        self.discard(key)
+        self._items[key] = value
+        self.size += self.sizeof(value)
+
+        while self.size > self.max_size:
+            _, evicted = self._items.popitem(last=False)
+            self.size -= self.sizeof(evicted)
+            self.evictions += 1
+
+    def discard(self, key: str) -> None:
+        value = self._items.pop(key, None)
+        if value is not None:
+            self.size -= self.sizeof(value)
+
+    def clear(self) -> None:
+        self._items.clear()
+        self.size = 0
+
+
+class MemoryCache(LRUCache[bytes]):
+    def sizeof(self, value: bytes) -> int:
+        return len(value)
@@ -0,0 +1,146 @@
+import asyncio
+import bisect
+import random
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from genesis.profiling import log_duration
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def format_labels(labels: Dict[str, str], **extra: str) -> str:
+    labels = {**labels, **extra}
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels.items()) + "}"
+
+
+class Metric(ABC):
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Optional[Dict[str, str]] = None) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels or {}
+        REGISTRY.append(self)
+
+    @abstractmethod
+    def samples(self) -> List[Tuple[str, str, float]]:
+        pass
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Optional[Dict[str, str]] = None,
+        function: Optional[Callable[[], float]] = None,
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self.value = 0.0
+        # computed only when scraped
+        self.function = function
+
+    def inc(self, value: float = 1) -> None:
+        self.value += value
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        try:
+            value = self.function() if self.function else self.value
+        except RuntimeError:
+            # asyncio state is not available outside of a running loop, the sample is skipped
+            return []
+        return [(self.name, format_labels(self.labels), value)]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, value: float = 1) -> None:
+        self.value -= value
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    @contextmanager
+    def track_in_progress(self) -> Iterator[None]:
+        self.inc()
+        try:
+            yield
+        finally:
+            self.dec()
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Optional[Dict[str, str]] = None,
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    @contextmanager
+    def time(self, profiling_message: Optional[str] = None) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            if profiling_message:
+                with log_duration(profiling_message):
+                    yield
+            else:
+                yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        samples: List[Tuple[str, str, float]] = []
+        cumulative = 0
+        for bucket, count in zip((*self.buckets, "+Inf"), self.counts):
+            cumulative += count
+            samples.append((f"{self.name}_bucket", format_labels(self.labels, le=str(bucket)), cumulative))
+        samples.append((f"{self.name}_sum", format_labels(self.labels), self.sum))
+        samples.append((f"{self.name}_count", format_labels(self.labels), cumulative))
+        return samples
+
+
+REGISTRY: List[Metric] = []
+
+
+def render_metrics() -> str:
+    # metrics sharing a name differ only in labels and have to be rendered together
+    metrics_by_name: Dict[str, List[Metric]] = {}
+    for metric in REGISTRY:
+        metrics_by_name.setdefault(metric.name, []).append(metric)
+
+    lines = []
+    for name, metrics in metrics_by_name.items():
+        lines.append(f"# HELP {name} {metrics[0].documentation}")
+        lines.append(f"# TYPE {name} {metrics[0].type}")
+        for metric in metrics:
+            lines.extend(f"{sample}{labels} {value}" for sample, labels, value in metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+def should_profile(sample_rate: float) -> bool:
+    return sample_rate > 0 and random.random() < sample_rate
+
+
+ASYNCIO_TASKS = Gauge(
+    "sidecar_asyncio_tasks", "Number of asyncio tasks of the worker", function=lambda: len(asyncio.all_tasks())
+)
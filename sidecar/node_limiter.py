@@ -0,0 +1,65 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncContextManager, AsyncIterator, Dict
+
+from sidecar.config import CONFIG
+from sidecar.metrics import Counter, Gauge, Histogram
+
+
+class NodeOverloaded(Exception):
+    pass
+
+
+class AdmissionLimiter:
+    def __init__(self, operation: str, concurrency: int, queue_size: int) -> None:
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.queue_size = queue_size
+        self.waiting = 0
+        self.queue_duration = Histogram(
+            "sidecar_node_queue_duration_seconds", "Time spent waiting for a node call slot", {"operation": operation}
+        )
+        self.in_progress = Gauge("sidecar_node_calls_in_progress", "Node calls in progress", {"operation": operation})
+        self.queued = Gauge(
+            "sidecar_node_calls_queued", "Node calls waiting for a slot", {"operation": operation}, lambda: self.waiting
+        )
+        self.rejected = Counter(
+            "sidecar_node_calls_rejected_total", "Node calls rejected due to full queue", {"operation": operation}
+        )
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[None]:
+        if self.semaphore.locked() and self.waiting >= self.queue_size:
+            self.rejected.inc()
+            raise NodeOverloaded(f"{self.waiting} calls are already waiting for the node")
+
+        self.waiting += 1
+        start = time.perf_counter()
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+            self.queue_duration.observe(time.perf_counter() - start)
+
+        try:
+            with self.in_progress.track_in_progress():
+                yield
+        finally:
+            self.semaphore.release()
+
+
+LIMITERS: Dict[str, AdmissionLimiter] = {}
+
+
+def get_limiter(operation: str) -> AdmissionLimiter:
+    if operation not in LIMITERS:
+        LIMITERS[operation] = AdmissionLimiter(
+            operation,
+            concurrency=CONFIG.node_concurrency_per_operation.get(operation, CONFIG.node_concurrency),
+            queue_size=CONFIG.node_queue_size,
+        )
+    return LIMITERS[operation]
+
+
+def limit_node_calls(operation: str) -> AsyncContextManager[None]:
+    return get_limiter(operation).acquire()
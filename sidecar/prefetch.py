@@ -0,0 +1,79 @@
+import asyncio
+from typing import Optional
+
+import orjson
+from fastapi import HTTPException, status
+from genesis.logging import logger
+
+from sidecar.config import CONFIG, REDIS
+from sidecar.routes_v1_0 import route_get_block_by_height, route_get_transaction_by_hash
+from sidecar.tip import fetch_tip_height
+
+
+def get_prefetch_claim_key(height: int) -> str:
+    return f"{CONFIG.node_blockchain.blockchain_name}/prefetch/{height}"
+
+
+async def prefetch_transaction(transaction_hash: str, semaphore: asyncio.Semaphore) -> None:
+    async with semaphore:
+        await route_get_transaction_by_hash(transaction_hash=transaction_hash)
+
+
+async def prefetch_block(height: int) -> None:
+    # goes through cache_response of the route so the block ends up under the key clients ask for
+    response = await route_get_block_by_height(block_height=height)
+    logger.info("Prefetched block %d", height)
+
+    if CONFIG.prefetch_transactions:
+        block = orjson.loads(response.body)
+        semaphore = asyncio.Semaphore(CONFIG.prefetch_concurrency)
+        await asyncio.gather(
+            *[prefetch_transaction(transaction["hash"], semaphore) for transaction in block["transactions"]]
+        )
+
+
+async def prefetch_height(height: int) -> bool:
+    # every worker of every replica polls the node, only one of them fetches the block
+    claim_key = get_prefetch_claim_key(height)
+    if not await REDIS.set(claim_key, 1, nx=True, ex=CONFIG.prefetch_claim_ttl):
+        return True
+
+    try:
+        await prefetch_block(height)
+    except HTTPException as exc:
+        if exc.status_code not in (status.HTTP_404_NOT_FOUND, status.HTTP_204_NO_CONTENT):
+            await REDIS.delete(claim_key)
+            logger.warning("Prefetching block %d failed with status %d", height, exc.status_code)
+            return False
+        # missing or skipped blocks would not be there on the next try either
+        logger.info("Block %d is missing or skipped, not prefetched", height)
+    except Exception:  # pylint: disable=broad-except
+        await REDIS.delete(claim_key)
+        logger.exception("Prefetching block %d failed", height)
+        return False
+    return True
+
+
+async def prefetch_new_blocks(last_height: Optional[int]) -> int:
+    height = await fetch_tip_height()
+    if last_height is None:
+        last_height = height - 1
+
+    failed = False
+    for new_height in range(max(last_height + 1, height - CONFIG.prefetch_max_blocks + 1), height + 1):
+        # later heights are prefetched anyway, the next round starts again from the first failed one
+        failed = not await prefetch_height(new_height) or failed
+        if not failed:
+            last_height = new_height
+
+    return last_height
+
+
+async def prefetch_new_blocks_periodically() -> None:
+    last_height = None
+    while True:
+        await asyncio.sleep(CONFIG.prefetch_interval)
+        try:
+            last_height = await prefetch_new_blocks(last_height)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Prefetching blocks failed")
@@ -0,0 +1,8 @@
+from typing import Any, Sequence
+
+from aioredis import Redis
+
+
+async def run_script(redis: Redis, script: str, keys: Sequence[str], args: Sequence[Any]) -> Any:
+    # registering only computes sha1 of the script, the call itself is EVALSHA with a fallback to SCRIPT LOAD
+    return await redis.register_script(script)(keys=keys, args=args)
@@ -1,18 +1,29 @@
-from typing import Dict
+from typing import Dict, List, Union
 
 import sentry_sdk
 from fastapi import Depends, FastAPI, HTTPException, status
 from fastapi.middleware import Middleware
-from fastapi.responses import RedirectResponse
+from fastapi.responses import PlainTextResponse, RedirectResponse
 from fastapi.security import HTTPAuthorizationCredentials
 from genesis.blockchain.factory import NodeAdapterFactory, ParserFactory
 from genesis.logging import logger
 from sentry_sdk.integrations.asgi import SentryAsgiMiddleware
 
 from sidecar import routes_v1_0
-from sidecar.auth import api_key_header_auth
+from sidecar.async_utils import create_task_safely
+from sidecar.auth import api_key_header_auth, invalidate_api_keys_on_change_forever
+from sidecar.block_store import close_block_store, open_block_store
 from sidecar.config import CONFIG, REDIS
+from sidecar.executor import start_executor, stop_executor
+from sidecar.limits import (
+    broadcast_limit_consumption_periodically,
+    close_sync_session,
+    release_unused_leases_periodically,
+)
+from sidecar.metrics import render_metrics
 from sidecar.models import Limit
+from sidecar.prefetch import prefetch_new_blocks_periodically
+from sidecar.redis_utils import run_script
 
 middleware = []
 
@@ -28,23 +39,58 @@ app = FastAPI(openapi_url=None, middleware=middleware)
 app.include_router(routes_v1_0.router, prefix="/v1.0")
 
 
+# Adds consumption of other sidecars and shortens the local window to the remote one.
+SYNC_LIMITS_SCRIPT = """
+for i, key in ipairs(KEYS) do
+    local ttl = tonumber(ARGV[2 * i])
+    redis.call('INCRBY', key, ARGV[2 * i - 1])
+    local local_ttl = redis.call('TTL', key)
+    if local_ttl < 0 or local_ttl > ttl then
+        redis.call('EXPIRE', key, ttl)
+    end
+end
+return 0
+"""
+
+
 @app.on_event("startup")
 async def startup() -> None:
     CONFIG.adapter = await NodeAdapterFactory.get_client(
         CONFIG.node_blockchain, url=CONFIG.node_url, token=CONFIG.node_token
     )
     CONFIG.parser = await ParserFactory.get_parser(CONFIG.node_blockchain, CONFIG.adapter)
+    start_executor()
+    open_block_store(routes_v1_0.get_block_store_prefixes())
+    create_task_safely(invalidate_api_keys_on_change_forever())
+    if CONFIG.limit_lease_size:
+        create_task_safely(release_unused_leases_periodically())
+    if CONFIG.sidecar_urls:
+        create_task_safely(broadcast_limit_consumption_periodically())
+    if CONFIG.prefetch_enabled:
+        create_task_safely(prefetch_new_blocks_periodically())
     logger.info("Starting sidecar for %s connecting to %s", CONFIG.node_blockchain.blockchain_name, CONFIG.node_url)
 
 
+@app.on_event("shutdown")
+async def shutdown() -> None:
+    await close_sync_session()
+    stop_executor()
+    close_block_store()
+
+
 @app.get("/")
 async def index() -> Dict:
     return RedirectResponse("v1.0")
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 @app.post("/limit")
 async def sync_limit(
-    limit: Limit,
+    limits: Union[List[Limit], Limit],
     api_key_header: HTTPAuthorizationCredentials = Depends(api_key_header_auth),
 ) -> None:
     if api_key_header is None or api_key_header.credentials != CONFIG.sidecar_token:
@@ -53,14 +99,13 @@ async def sync_limit(
             detail="Invalid API Key",
         )
 
-    new_value = await REDIS.incrby(limit.key, limit.value)
-    local_ttl = await REDIS.ttl(limit.key)
-    logger.debug(
-        "sync limit: %s, new value: %d, local ttl: %d, remote ttl: %d",
-        limit.key,
-        new_value,
-        local_ttl,
-        limit.ttl,
+    if isinstance(limits, Limit):
+        limits = [limits]
+
+    await run_script(
+        REDIS,
+        SYNC_LIMITS_SCRIPT,
+        keys=[limit.key for limit in limits],
+        args=[argument for limit in limits for argument in (limit.value, limit.ttl)],
     )
-    if local_ttl < 0 or local_ttl > limit.ttl:
-        await REDIS.expire(limit.key, limit.ttl)
+    logger.debug("sync limit: %s", limits)
@@ -1,20 +1,33 @@
-from typing import Dict
+from functools import partial
+from typing import Any, Dict, List, Optional, Tuple
 
-from fastapi import APIRouter, Depends, status
-from fastapi.responses import ORJSONResponse
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from genesis.encoders import fast_serializer_to_bytes
 from genesis.logging import logger
 from genesis.models import PlainBlock, PlainTransaction, TokenInfo
 
-from sidecar.caching import cache_response
-from sidecar.config import CONFIG
+from sidecar.auth import get_api_key_and_limit
+from sidecar.batching import stream_json_array, stream_ndjson
+from sidecar.cache_policy import get_block_depth, get_block_ttl, is_block_confirmed
+from sidecar.caching import (
+    CachePolicy,
+    cache_response,
+    get_cache_key,
+    get_method_signature,
+    make_alias,
+)
+from sidecar.compression import compress_value
+from sidecar.config import CONFIG, REDIS
 from sidecar.http_transformations import transform_to_http_exception
-from sidecar.limits import rate_limiter
+from sidecar.limits import charge_limits, rate_limiter
 from sidecar.operations_v1_0 import (
     get_block_by_hash,
     get_block_by_height,
-    get_block_latest,
+    get_block_count,
     get_transaction_by_hash,
 )
+from sidecar.tip import TIP
 
 router = APIRouter()
 
@@ -29,17 +42,52 @@ async def index() -> Dict:
     return {"endpoints": endpoints}
 
 
+def get_transaction_cache_key(transaction_hash: str) -> str:
+    return get_cache_key(
+        get_method_signature(route_get_transaction_by_hash, (), dict(transaction_hash=transaction_hash))
+    )
+
+
+async def index_transactions(_key: str, block: PlainBlock) -> List[Tuple[str, bytes]]:
+    # blocks of some chains contain full transactions, their lookups are answered without calling the node
+    return [
+        (get_transaction_cache_key(transaction.hash), compress_value(fast_serializer_to_bytes(transaction.dict())))
+        for transaction in block.transactions
+        if isinstance(transaction, PlainTransaction)
+    ]
+
+
+async def index_block_by_height(key: str, block: PlainBlock) -> List[Tuple[str, bytes]]:
+    # the lookup by hash is answered by the entry of the height, the alias expires together with it
+    block_key = get_cache_key(get_method_signature(route_get_block_by_hash, (), dict(block_hash=block.hash)))
+    return [(block_key, make_alias(key, block.hash)), *await index_transactions(key, block)]
+
+
+CACHE_SECONDS = 600
+# shared with the warm-up, which stores blocks the same way as the route
+BLOCK_BY_HEIGHT_POLICY = CachePolicy(
+    seconds=CACHE_SECONDS,
+    depth=get_block_depth,
+    ttl=get_block_ttl,
+    index=index_block_by_height,
+    persist=is_block_confirmed,
+)
+
+
 @router.get(
     "/blocks/latest",
     response_model=PlainBlock,
     response_class=ORJSONResponse,
     dependencies=[Depends(rate_limiter)],
 )
-async def route_get_latest_block() -> ORJSONResponse:
+async def route_get_latest_block(request: Request) -> ORJSONResponse:
     logger.info("%s: get_latest_block()", CONFIG.node_blockchain.blockchain_name)
 
     with transform_to_http_exception():
-        return await get_block_latest()
+        block_height = await get_block_count()
+
+    # resolved to the cached block so polling clients do not fetch and decode the tip repeatedly
+    return await route_get_block_by_height(block_height=block_height, http_request=request)
 
 
 @router.get(
@@ -48,7 +96,7 @@ async def route_get_latest_block() -> ORJSONResponse:
     response_class=ORJSONResponse,
     dependencies=[Depends(rate_limiter)],
 )
-@cache_response(seconds=600, extend_life_on_hit=False)
+@cache_response(BLOCK_BY_HEIGHT_POLICY, extend_life_on_hit=False)
 async def route_get_block_by_height(block_height: int) -> PlainBlock:
     logger.info("%s: route_get_block_by_height(%s)", CONFIG.node_blockchain.blockchain_name, block_height)
 
@@ -62,7 +110,16 @@ async def route_get_block_by_height(block_height: int) -> PlainBlock:
     response_class=ORJSONResponse,
     dependencies=[Depends(rate_limiter)],
 )
-@cache_response(seconds=600)
+@cache_response(
+    CachePolicy(
+        seconds=CACHE_SECONDS,
+        depth=get_block_depth,
+        ttl=get_block_ttl,
+        index=index_transactions,
+        persist=is_block_confirmed,
+    ),
+    immutable=True,
+)
 async def route_get_block_by_hash(block_hash: str) -> PlainBlock:
     logger.info("%s: route_get_block_by_hash(%s)", CONFIG.node_blockchain.blockchain_name, block_hash)
 
@@ -76,7 +133,7 @@ async def route_get_block_by_hash(block_hash: str) -> PlainBlock:
     response_class=ORJSONResponse,
     dependencies=[Depends(rate_limiter)],
 )
-@cache_response(seconds=600)
+@cache_response(CachePolicy(seconds=CACHE_SECONDS), immutable=True)
 async def route_get_transaction_by_hash(transaction_hash: str) -> PlainTransaction:
     logger.info("%s: get_transaction_by_hash(%s)", CONFIG.node_blockchain.blockchain_name, transaction_hash)
 
@@ -84,18 +141,103 @@ async def route_get_transaction_by_hash(transaction_hash: str) -> PlainTransacti
         return await get_transaction_by_hash(transaction_hash)
 
 
+def get_block_store_prefixes() -> List[str]:
+    # responses of other routes are never persisted, their misses are not looked up on the disk
+    routes = [route_get_block_by_height, route_get_block_by_hash, route_get_transaction_by_hash]
+    return [get_cache_key(f"{route.__name__}(") for route in routes]
+
+
+def validate_batch_size(size: int, max_size: int) -> None:
+    if not 0 < size <= max_size:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Number of requested items has to be between 1 and {max_size}",
+        )
+
+
+@router.get("/blocks", response_class=StreamingResponse)
+async def route_get_blocks(
+    request: Request,
+    from_height: int = Query(alias="from"),
+    to_height: int = Query(alias="to"),
+    api_key_info: Tuple[Optional[str], float] = Depends(get_api_key_and_limit),
+) -> StreamingResponse:
+    logger.info("%s: route_get_blocks(%s, %s)", CONFIG.node_blockchain.blockchain_name, from_height, to_height)
+    heights = range(from_height, to_height + 1)
+    validate_batch_size(len(heights), CONFIG.batch_max_items)
+    await charge_limits(request, api_key_info, cost=len(heights))
+
+    keys = [
+        get_cache_key(get_method_signature(route_get_block_by_height, (), dict(block_height=height)))
+        for height in heights
+    ]
+    fetchers = [partial(route_get_block_by_height, block_height=height) for height in heights]
+    return StreamingResponse(stream_json_array(keys, fetchers), media_type="application/json")
+
+
+@router.post("/transactions", response_class=StreamingResponse)
+async def route_get_transactions(
+    request: Request,
+    transaction_hashes: List[str] = Body(),
+    api_key_info: Tuple[Optional[str], float] = Depends(get_api_key_and_limit),
+) -> StreamingResponse:
+    logger.info("%s: route_get_transactions(%d)", CONFIG.node_blockchain.blockchain_name, len(transaction_hashes))
+    validate_batch_size(len(transaction_hashes), CONFIG.batch_max_items)
+    await charge_limits(request, api_key_info, cost=len(transaction_hashes))
+
+    keys = [get_transaction_cache_key(transaction_hash) for transaction_hash in transaction_hashes]
+    fetchers = [
+        partial(route_get_transaction_by_hash, transaction_hash=transaction_hash)
+        for transaction_hash in transaction_hashes
+    ]
+    return StreamingResponse(stream_json_array(keys, fetchers, immutable=True), media_type="application/json")
+
+
+@router.get("/export/blocks", response_class=StreamingResponse)
+async def route_export_blocks(
+    request: Request,
+    from_height: int = Query(alias="from"),
+    to_height: int = Query(alias="to"),
+    api_key_info: Tuple[Optional[str], float] = Depends(get_api_key_and_limit),
+) -> StreamingResponse:
+    logger.info("%s: route_export_blocks(%s, %s)", CONFIG.node_blockchain.blockchain_name, from_height, to_height)
+    heights = range(from_height, to_height + 1)
+    validate_batch_size(len(heights), CONFIG.export_max_items)
+    await charge_limits(request, api_key_info, cost=len(heights))
+
+    fetchers = (partial(get_block_by_height, height) for height in heights)
+    return StreamingResponse(stream_ndjson(fetchers), media_type="application/x-ndjson")
+
+
 @router.get("/status", response_class=ORJSONResponse)
 async def get_status() -> ORJSONResponse:
-    response_ok = ORJSONResponse(content=dict(status="ok"), status_code=status.HTTP_200_OK)
-    response_ko = ORJSONResponse(content=dict(status="ko"), status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+    # readiness, only cheap checks as load balancers call it often
+    content: Dict[str, Any] = dict(status="ok")
 
     try:
-        await route_get_latest_block()
+        await REDIS.ping()
+        content["redis"] = "ok"
     except Exception:  # pylint: disable=broad-except
-        logger.exception("Status: get latest block")
-        return response_ko
+        logger.exception("Status: redis ping")
+        content.update(status="ko", redis="ko")
+
+    try:
+        content["height"] = await get_block_count()
+        content["tip_lag"] = round(TIP.lag(), 3)
+    except Exception:  # pylint: disable=broad-except
+        logger.exception("Status: get block count")
+        content.update(status="ko", height=None)
+    else:
+        if CONFIG.status_max_tip_lag and content["tip_lag"] > CONFIG.status_max_tip_lag:
+            content["status"] = "ko"
+
+    status_code = status.HTTP_200_OK if content["status"] == "ok" else status.HTTP_503_SERVICE_UNAVAILABLE
+    return ORJSONResponse(content=content, status_code=status_code)
+
 
-    return response_ok
+@router.get("/status/live", response_class=ORJSONResponse)
+async def get_status_live() -> ORJSONResponse:
+    return ORJSONResponse(content=dict(status="ok"), status_code=status.HTTP_200_OK)
 
 
 @router.get("/tokens", response_class=ORJSONResponse)
@@ -3,6 +3,7 @@ from unittest.mock import patch
 import pytest
 import pytest_asyncio
 import sentry_sdk
+from fakeredis import FakeServer
 from fakeredis.aioredis import FakeRedis
 from fastapi.testclient import TestClient
 from genesis.blockchain.adapter import NodeAdapter
@@ -14,8 +15,12 @@ from genesis.blockchain.bitcoin.tests.fixtures.pubkey_transaction import (
 from genesis.blockchain.parser import Parser
 from genesis.blockchains import Blockchain
 
+from sidecar.auth import API_KEYS_CACHE
+from sidecar.caching import MEMORY_CACHE
 from sidecar.config import CONFIG
+from sidecar.limits import LEASES, PENDING_LIMIT_SYNC
 from sidecar.routes import app
+from sidecar.tip import TIP
 
 BLOCK_DICT = BLOCK_JSON
 BLOCK = BLOCK_DECODED
@@ -42,6 +47,31 @@ def disable_sentry() -> None:
     sentry_sdk.init(dsn="")
 
 
+@pytest.fixture(autouse=True)
+def clear_memory_cache() -> None:
+    yield
+    MEMORY_CACHE.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_limits_state() -> None:
+    yield
+    LEASES.clear()
+    PENDING_LIMIT_SYNC.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_api_keys_cache() -> None:
+    yield
+    API_KEYS_CACHE.clear()
+
+
+@pytest.fixture(autouse=True)
+def reset_tip() -> None:
+    yield
+    TIP.reset()
+
+
 @pytest.fixture
 def test_client() -> TestClient:
     with patch("sidecar.config.CONFIG.adapter", new=NODE_ADAPTER):
@@ -51,9 +81,13 @@ def test_client() -> TestClient:
 
 @pytest_asyncio.fixture(autouse=True, scope="function")
 async def fake_redis() -> FakeRedis:
-    instance = FakeRedis()
+    # shared server, otherwise connections taken for pubsub would not see published messages
+    instance = FakeRedis(server=FakeServer())
     with patch("sidecar.auth.REDIS", instance):
         with patch("sidecar.limits.REDIS", instance):
             with patch("sidecar.caching.REDIS", instance):
                 with patch("sidecar.routes.REDIS", instance):
-                    yield instance
+                    with patch("sidecar.routes_v1_0.REDIS", instance):
+                        with patch("sidecar.prefetch.REDIS", instance):
+                            with patch("sidecar.warmup.REDIS", instance):
+                                yield instance
@@ -1,3 +1,4 @@
+import asyncio
 from unittest.mock import patch
 
 import pytest
@@ -5,6 +6,7 @@ from fakeredis.aioredis import FakeRedis
 from fastapi import status
 from fastapi.testclient import TestClient
 
+from sidecar.auth import API_KEYS_CACHE, invalidate_api_keys_on_change
 from sidecar.config import CONFIG
 from sidecar.limits import get_limits_key
 from sidecar.tests.utils import make_request_for_block_by_hash
@@ -54,3 +56,53 @@ async def test_invalid_api_key_header(test_client: TestClient, fake_redis: FakeR
     API_KEY = "testclientkey"
     await fake_redis.hset(CONFIG.api_key_hash, API_KEY, 1)
     make_request_for_block_by_hash(test_client, api_key_header=API_KEY)
+
+
+@pytest.mark.asyncio
+async def test_api_key_limit_is_cached(test_client: TestClient, fake_redis: FakeRedis) -> None:
+    API_KEY = "testclientkey"
+    await fake_redis.hset(CONFIG.api_key_hash, API_KEY, 10)
+    make_request_for_block_by_hash(test_client, api_key_query=API_KEY)
+
+    await fake_redis.hdel(CONFIG.api_key_hash, API_KEY)
+    make_request_for_block_by_hash(test_client, api_key_query=API_KEY)
+
+
+@pytest.mark.asyncio
+async def test_invalid_api_key_is_cached(test_client: TestClient, fake_redis: FakeRedis) -> None:
+    make_request_for_block_by_hash(
+        test_client, api_key_query="invalid", expected_status_code=status.HTTP_401_UNAUTHORIZED
+    )
+    cached = API_KEYS_CACHE.get("invalid")
+    assert cached is not None and cached[0] is None
+
+    await fake_redis.hset(CONFIG.api_key_hash, "invalid", 10)
+    make_request_for_block_by_hash(
+        test_client, api_key_query="invalid", expected_status_code=status.HTTP_401_UNAUTHORIZED
+    )
+
+
+@pytest.mark.asyncio
+@patch("sidecar.config.CONFIG.api_key_cache_ttl", 0)
+async def test_api_key_cache_expires(test_client: TestClient, fake_redis: FakeRedis) -> None:
+    API_KEY = "testclientkey"
+    await fake_redis.hset(CONFIG.api_key_hash, API_KEY, 10)
+    make_request_for_block_by_hash(test_client, api_key_query=API_KEY)
+
+    await fake_redis.hdel(CONFIG.api_key_hash, API_KEY)
+    make_request_for_block_by_hash(
+        test_client, api_key_query=API_KEY, expected_status_code=status.HTTP_401_UNAUTHORIZED
+    )
+
+
+@pytest.mark.asyncio
+async def test_api_keys_cache_invalidated_on_change(fake_redis: FakeRedis) -> None:
+    API_KEYS_CACHE.set("testclientkey", (b"10", float("inf")))
+    listener = asyncio.create_task(invalidate_api_keys_on_change())
+    await asyncio.sleep(0.1)
+
+    await fake_redis.publish(CONFIG.api_key_channel, "changed")
+    await asyncio.sleep(0.1)
+    listener.cancel()
+
+    assert not API_KEYS_CACHE
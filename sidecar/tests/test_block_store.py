@@ -0,0 +1,132 @@
+import os
+import threading
+from pathlib import Path
+from typing import Optional
+from unittest.mock import patch
+
+import pytest
+from flexmock import flexmock
+
+from sidecar.block_store import RECORD, BlockStore, read_from_block_store
+
+
+def open_store(path: Path, segment_size: int = 1024) -> BlockStore:
+    return BlockStore(str(path), segment_size, [""])
+
+
+def test_get_stored_value(tmp_path: Path) -> None:
+    store = open_store(tmp_path)
+    store.put([("a", b"value a"), ("b", b"value b")])
+
+    assert store.get("a") == b"value a"
+    assert store.get("b") == b"value b"
+    assert store.get("c") is None
+
+
+def test_values_are_not_overwritten(tmp_path: Path) -> None:
+    store = open_store(tmp_path)
+    store.put([("a", b"value a")])
+    store.put([("a", b"other value")])
+
+    assert store.get("a") == b"value a"
+
+
+def test_values_survive_restart(tmp_path: Path) -> None:
+    open_store(tmp_path).put([("a", b"value a")])
+    assert open_store(tmp_path).get("a") == b"value a"
+
+
+def test_values_written_by_other_process_are_found(tmp_path: Path) -> None:
+    store = open_store(tmp_path)
+    assert store.get("a") is None
+
+    open_store(tmp_path).put([("a", b"value a")])
+    assert store.get("a") == b"value a"
+
+
+def test_full_segment_is_not_appended_to(tmp_path: Path) -> None:
+    store = open_store(tmp_path, segment_size=4)
+    store.put([("a", b"value a")])
+    store.put([("b", b"value b")])
+
+    assert store.get("a") == b"value a"
+    assert store.get("b") == b"value b"
+    assert os.path.exists(store.get_segment_path(1))
+
+
+def test_keys_of_other_prefixes_are_not_looked_up(tmp_path: Path) -> None:
+    store = BlockStore(str(tmp_path), 1024, ["block/"])
+    store.put([("block/a", b"value a"), ("other/b", b"value b")])
+
+    flexmock(store).should_receive("get_index").never()
+    assert store.get("other/b") is None
+    assert os.path.getsize(store.get_segment_path(0)) == RECORD.size + len(b"block/a") + len(b"value a")
+
+
+def test_variants_are_not_persisted(tmp_path: Path) -> None:
+    store = BlockStore(str(tmp_path), 1024, ["block/"])
+    store.put([("block/a|gzip", b"variant")])
+
+    flexmock(store).should_receive("get_index").never()
+    assert store.get("block/a|gzip") is None
+    assert not os.path.exists(store.get_segment_path(0))
+
+
+@pytest.mark.asyncio
+async def test_read_does_not_block_event_loop(tmp_path: Path) -> None:
+    store = open_store(tmp_path)
+    store.put([("a", b"value a")])
+    threads = []
+
+    def get(key: str) -> Optional[bytes]:
+        threads.append(threading.get_ident())
+        return BlockStore.get(store, key)
+
+    flexmock(store).should_receive("get").replace_with(get)
+    with patch("sidecar.block_store.BLOCK_STORE", store):
+        assert await read_from_block_store("a") == b"value a"
+    assert threads and threads[0] != threading.get_ident()
+
+
+def test_torn_tail_is_truncated_on_open(tmp_path: Path) -> None:
+    store = open_store(tmp_path)
+    store.put([("a", b"value a")])
+    size = os.path.getsize(store.get_segment_path(0))
+    with open(store.get_segment_path(0), "ab") as file:
+        file.write(b"torn")
+
+    store = open_store(tmp_path)
+    assert os.path.getsize(store.get_segment_path(0)) == size
+    store.put([("b", b"value b")])
+    assert store.get("a") == b"value a"
+    assert store.get("b") == b"value b"
+
+
+def test_torn_tail_of_other_process_is_overwritten(tmp_path: Path) -> None:
+    store = open_store(tmp_path)
+    with open(store.get_segment_path(0), "ab") as file:
+        file.write(b"torn")
+
+    store.put([("a", b"value a")])
+    assert open_store(tmp_path).get("a") == b"value a"
+
+
+def test_corrupted_record_is_a_miss(tmp_path: Path) -> None:
+    store = open_store(tmp_path)
+    store.put([("a", b"value a")])
+    with open(store.get_segment_path(0), "r+b") as file:
+        file.seek(-1, os.SEEK_END)
+        file.write(b"b")
+
+    assert open_store(tmp_path).get("a") is None
+
+
+@patch("sidecar.block_store.INDEX_INITIAL_SLOTS", 4)
+def test_index_grows_for_other_processes(tmp_path: Path) -> None:
+    store = open_store(tmp_path)
+    assert store.get("a") is None
+
+    entries = [(f"key {i}", f"value {i}".encode()) for i in range(10)]
+    open_store(tmp_path).put(entries)
+    for key, value in entries:
+        assert store.get(key) == value
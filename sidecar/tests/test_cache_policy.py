@@ -0,0 +1,42 @@
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+from flexmock import flexmock
+from genesis.blockchain.exceptions import Unavailable
+from genesis.blockchain.tests.utils import AwaitableValue
+
+from sidecar.cache_policy import get_block_depth, get_block_ttl
+from sidecar.config import CONFIG
+from sidecar.tests.conftest import BLOCK, NODE_ADAPTER
+from sidecar.tip import TIP
+
+
+@pytest.mark.asyncio
+@patch("sidecar.config.CONFIG.cache_confirmations", {"ethereum": 10})
+@patch("sidecar.config.CONFIG.cache_ttl_near_tip", 5)
+@patch("sidecar.config.CONFIG.cache_ttl_confirmed", 0)
+async def test_block_ttl_by_depth() -> None:
+    TIP.update(BLOCK.height + 9)
+    assert get_block_ttl(await get_block_depth(BLOCK), 600) == 5
+
+    TIP.update(BLOCK.height + 10)
+    assert get_block_ttl(await get_block_depth(BLOCK), 600) == 0
+
+
+@pytest.mark.asyncio
+async def test_block_ttl_default_confirmations() -> None:
+    TIP.update(BLOCK.height + CONFIG.cache_confirmations_default)
+    assert get_block_ttl(await get_block_depth(BLOCK), 600) == CONFIG.cache_ttl_confirmed
+
+
+@pytest.mark.asyncio
+async def test_block_ttl_fetches_unknown_tip(test_client: TestClient) -> None:
+    flexmock(NODE_ADAPTER).should_receive("get_block_count").and_return(AwaitableValue(BLOCK.height + 1000)).once()
+    assert get_block_ttl(await get_block_depth(BLOCK), 600) == CONFIG.cache_ttl_confirmed
+
+
+@pytest.mark.asyncio
+async def test_block_ttl_without_tip(test_client: TestClient) -> None:
+    flexmock(NODE_ADAPTER).should_receive("get_block_count").and_raise(Unavailable).once()
+    assert get_block_ttl(await get_block_depth(BLOCK), 600) == CONFIG.cache_ttl_near_tip
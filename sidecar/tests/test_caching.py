@@ -1,22 +1,53 @@
+import asyncio
+import gzip
 import time
+from typing import Dict
 from unittest.mock import patch
 
 import pytest
 from fakeredis.aioredis import FakeRedis
+from fastapi import Request
 from fastapi.testclient import TestClient
 from flexmock import flexmock
+from genesis.blockchain.exceptions import DoesNotExist, Unavailable
+from genesis.blockchain.tests.utils import AwaitableValue
 from starlette import status
 
-from sidecar.tests.conftest import NODE_ADAPTER
+import sidecar.caching
+from sidecar.async_utils import ABANDONED_TASKS
+from sidecar.block_store import BlockStore
+from sidecar.caching import (
+    CACHE_MISSES_MEMORY,
+    MEMORY_CACHE,
+    encode_and_store,
+    extend_expiry,
+    get_cached_many,
+    get_lock_key,
+    get_variant_key,
+    make_alias,
+)
+from sidecar.compression import MARKERS, decompress_value
+from sidecar.config import CONFIG
+from sidecar.routes_v1_0 import (
+    get_block_store_prefixes,
+    route_get_block_by_hash,
+    route_get_block_by_height,
+)
+from sidecar.tests.conftest import BLOCK, BLOCK_DICT, NODE_ADAPTER, PARSER, TRANSACTION
 from sidecar.tests.utils import (
     make_request_for_block_by_hash,
     make_request_for_block_by_height,
 )
+from sidecar.tip import TIP
 
 REDIS_CACHED_KEY_BLOCK_HASH = "ethereum/cache/route_get_block_by_hash(block_hash=hash)"
 REDIS_CACHED_KEY_BLOCK_HEIGHT = "ethereum/cache/route_get_block_by_height(block_height=10)"
 
 
+def make_request(headers: Dict[str, str]) -> Request:
+    return Request({"type": "http", "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()]})
+
+
 @pytest.mark.asyncio
 async def test_get_block_by_hash_response_not_cached(test_client: TestClient, fake_redis: FakeRedis) -> None:
     response_uncached = make_request_for_block_by_hash(test_client)
@@ -26,16 +57,19 @@ async def test_get_block_by_hash_response_not_cached(test_client: TestClient, fa
 @pytest.mark.asyncio
 async def test_get_block_by_hash_response_from_cache(test_client: TestClient, fake_redis: FakeRedis) -> None:
     response_uncached = make_request_for_block_by_hash(test_client)
+    MEMORY_CACHE.clear()
     time.sleep(1)
     first_ttl = await fake_redis.pttl(REDIS_CACHED_KEY_BLOCK_HASH)
     flexmock(NODE_ADAPTER).should_receive("get_block_by_hash").never()
 
-    response_cached = make_request_for_block_by_hash(test_client)
+    # requested on the loop of the test, which runs the extension of the expiry in the background
+    response_cached = await route_get_block_by_hash(block_hash="hash")
+    await asyncio.gather(*ABANDONED_TASKS)
     second_ttl = await fake_redis.pttl(REDIS_CACHED_KEY_BLOCK_HASH)
     assert 0 < first_ttl < second_ttl  # get_block_by_hash extends the cache TTL
-    assert response_uncached.content == response_cached.content
+    assert response_uncached.content == response_cached.body
     assert response_uncached.status_code == response_cached.status_code
-    assert response_uncached.headers == response_cached.headers
+    assert dict(response_uncached.headers) == dict(response_cached.headers)
 
 
 @pytest.mark.asyncio
@@ -65,3 +99,415 @@ async def test_do_not_cache_invalid_response(_mock, test_client: TestClient, fak
     response = make_request_for_block_by_hash(test_client, expected_status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
     assert response.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
     assert await fake_redis.get(REDIS_CACHED_KEY_BLOCK_HASH) is None
+
+
+@pytest.mark.asyncio
+async def test_get_block_by_hash_response_from_memory(test_client: TestClient, fake_redis: FakeRedis) -> None:
+    response_uncached = make_request_for_block_by_hash(test_client)
+    assert MEMORY_CACHE.get(REDIS_CACHED_KEY_BLOCK_HASH) == response_uncached.content
+
+    await fake_redis.flushall()
+    flexmock(NODE_ADAPTER).should_receive("get_block_by_hash").never()
+
+    response_cached = make_request_for_block_by_hash(test_client)
+    assert response_uncached.content == response_cached.content
+    assert await fake_redis.get(REDIS_CACHED_KEY_BLOCK_HASH) is None
+
+
+@pytest.mark.asyncio
+async def test_memory_misses_are_counted(test_client: TestClient, fake_redis: FakeRedis) -> None:
+    misses = CACHE_MISSES_MEMORY.value
+    make_request_for_block_by_hash(test_client)
+    make_request_for_block_by_hash(test_client)
+    assert CACHE_MISSES_MEMORY.value == misses + 1
+
+    MEMORY_CACHE.clear()
+    await get_cached_many([REDIS_CACHED_KEY_BLOCK_HASH, "missing"], immutable=True)
+    assert CACHE_MISSES_MEMORY.value == misses + 3
+
+
+@pytest.mark.asyncio
+async def test_get_block_by_height_response_not_in_memory(test_client: TestClient) -> None:
+    make_request_for_block_by_height(test_client)
+    assert len(MEMORY_CACHE) == 0
+
+
+async def get_block_slowly(*_args, **_kwargs):
+    await asyncio.sleep(0.01)
+    return BLOCK_DICT
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_are_coalesced(test_client: TestClient, fake_redis: FakeRedis) -> None:
+    flexmock(NODE_ADAPTER).should_receive("get_block_by_height").replace_with(get_block_slowly).once()
+    flexmock(PARSER).should_receive("decode_block").with_args(BLOCK_DICT).and_return(AwaitableValue(BLOCK)).once()
+
+    responses = await asyncio.gather(*[route_get_block_by_height(block_height=10) for _ in range(10)])
+
+    assert all(response.body == responses[0].body for response in responses)
+
+
+@pytest.mark.asyncio
+@patch("sidecar.config.CONFIG.cache_lock_enabled", True)
+async def test_miss_waits_for_other_replica(test_client: TestClient, fake_redis: FakeRedis) -> None:
+    flexmock(NODE_ADAPTER).should_receive("get_block_by_height").never()
+    await fake_redis.set(get_lock_key(REDIS_CACHED_KEY_BLOCK_HEIGHT), 1, ex=10)
+
+    async def other_replica_stores_block() -> None:
+        await asyncio.sleep(0.1)
+        await fake_redis.set(REDIS_CACHED_KEY_BLOCK_HEIGHT, b"{}")
+
+    _, response = await asyncio.gather(other_replica_stores_block(), route_get_block_by_height(block_height=10))
+
+    assert response.body == b"{}"
+
+
+@pytest.mark.asyncio
+@patch("sidecar.config.CONFIG.cache_lock_enabled", True)
+async def test_miss_waits_for_other_replica_storing_alias(test_client: TestClient, fake_redis: FakeRedis) -> None:
+    flexmock(NODE_ADAPTER).should_receive("get_block_by_hash").never()
+    await fake_redis.set(get_lock_key(REDIS_CACHED_KEY_BLOCK_HASH), 1, ex=10)
+
+    async def other_replica_stores_block() -> None:
+        await asyncio.sleep(0.1)
+        await fake_redis.set(REDIS_CACHED_KEY_BLOCK_HEIGHT, b'{"hash":"hash"}')
+        await fake_redis.set(REDIS_CACHED_KEY_BLOCK_HASH, make_alias(REDIS_CACHED_KEY_BLOCK_HEIGHT, "hash"))
+
+    _, response = await asyncio.gather(other_replica_stores_block(), route_get_block_by_hash(block_hash="hash"))
+
+    assert response.body == b'{"hash":"hash"}'
+
+
+@pytest.mark.asyncio
+@patch("sidecar.config.CONFIG.cache_lock_enabled", True)
+async def test_miss_with_lock_stores_response_and_releases_lock(test_client: TestClient, fake_redis: FakeRedis) -> None:
+    response = make_request_for_block_by_height(test_client)
+
+    assert await fake_redis.get(REDIS_CACHED_KEY_BLOCK_HEIGHT) == response.content
+    assert await fake_redis.get(get_lock_key(REDIS_CACHED_KEY_BLOCK_HEIGHT)) is None
+
+
+@pytest.mark.asyncio
+@patch("sidecar.config.CONFIG.cache_compression", "zstd")
+@patch("sidecar.config.CONFIG.cache_compression_min_size", 0)
+async def test_compressed_value_is_decompressed_for_client(test_client: TestClient, fake_redis: FakeRedis) -> None:
+    response_uncached = make_request_for_block_by_height(test_client)
+    cached = await fake_redis.get(REDIS_CACHED_KEY_BLOCK_HEIGHT)
+    assert cached[:1] == MARKERS["zstd"]
+    assert decompress_value(cached) == response_uncached.content
+
+    flexmock(NODE_ADAPTER).should_receive("get_block_by_height").never()
+    response_cached = test_client.get("/v1.0/blocks/10", headers={"Accept-Encoding": "identity"})
+    assert response_cached.content == response_uncached.content
+    assert "content-encoding" not in response_cached.headers
+
+
+@pytest.mark.asyncio
+@patch("sidecar.config.CONFIG.cache_compression", "zstd")
+@patch("sidecar.config.CONFIG.cache_compression_min_size", 0)
+async def test_compressed_value_is_sent_as_it_is(test_client: TestClient, fake_redis: FakeRedis) -> None:
+    make_request_for_block_by_height(test_client)
+    cached = await fake_redis.get(REDIS_CACHED_KEY_BLOCK_HEIGHT)
+
+    flexmock(NODE_ADAPTER).should_receive("get_block_by_height").never()
+    response = await route_get_block_by_height(
+        block_height=10, http_request=make_request({"Accept-Encoding": "gzip, zstd"})
+    )
+    assert response.body == cached[1:]
+    assert response.headers["content-encoding"] == "zstd"
+    assert response.headers["vary"] == "Accept-Encoding"
+
+
+@pytest.mark.asyncio
+@patch("sidecar.config.CONFIG.cache_compression", "zstd")
+async def test_uncompressed_value_is_served_with_compression_enabled(
+    test_client: TestClient, fake_redis: FakeRedis
+) -> None:
+    await fake_redis.set(REDIS_CACHED_KEY_BLOCK_HEIGHT, b"{}")
+    flexmock(NODE_ADAPTER).should_receive("get_block_by_height").never()
+
+    response = await route_get_block_by_height(block_height=10, http_request=make_request({"Accept-Encoding": "zstd"}))
+    assert response.body == b"{}"
+    assert "content-encoding" not in response.headers
+
+
+@pytest.mark.asyncio
+@patch("sidecar.config.CONFIG.response_compression", ["gzip"])
+async def test_compressed_variant_is_computed_once(test_client: TestClient, fake_redis: FakeRedis) -> None:
+    response_uncached = make_request_for_block_by_height(test_client)
+    request = make_request({"Accept-Encoding": "br;q=0, gzip"})
+
+    response = await route_get_block_by_height(block_height=10, http_request=request)
+    assert response.headers["content-encoding"] == "gzip"
+    assert gzip.decompress(response.body) == response_uncached.content
+
+    await asyncio.sleep(0.01)
+    assert await fake_redis.get(get_variant_key(REDIS_CACHED_KEY_BLOCK_HEIGHT, "gzip")) == response.body
+    flexmock(sidecar.caching).should_receive("encode_response").never()
+
+    response_cached = await route_get_block_by_height(block_height=10, http_request=request)
+    assert response_cached.body == response.body
+    assert response_cached.headers["content-encoding"] == "gzip"
+
+
+@pytest.mark.asyncio
+@patch("sidecar.config.CONFIG.response_compression", ["gzip"])
+@patch("sidecar.config.CONFIG.cache_ttl_near_tip", 5)
+async def test_variant_of_entry_not_stored_yet_expires_with_it(test_client: TestClient, fake_redis: FakeRedis) -> None:
+    TIP.update(BLOCK.height)
+    # the entry is stored in the background and is not in redis yet when its variant is stored
+    flexmock(sidecar.caching).should_receive("store_fetched").replace_with(lambda *_args: asyncio.sleep(0))
+    flexmock(NODE_ADAPTER).should_receive("get_block_by_height").and_return(AwaitableValue(BLOCK_DICT)).once()
+    flexmock(PARSER).should_receive("decode_block").with_args(BLOCK_DICT).and_return(AwaitableValue(BLOCK)).once()
+
+    await route_get_block_by_height(block_height=10, http_request=make_request({"Accept-Encoding": "gzip"}))
+    await asyncio.sleep(0.01)
+    assert 0 < await fake_redis.ttl(get_variant_key(REDIS_CACHED_KEY_BLOCK_HEIGHT, "gzip")) <= 5
+
+
+@pytest.mark.asyncio
+async def test_variant_of_entry_about_to_expire_is_not_kept_forever(fake_redis: FakeRedis) -> None:
+    await fake_redis.set(REDIS_CACHED_KEY_BLOCK_HEIGHT, b"{}", px=300)
+    assert await fake_redis.ttl(REDIS_CACHED_KEY_BLOCK_HEIGHT) == 0
+
+    await encode_and_store(REDIS_CACHED_KEY_BLOCK_HEIGHT, 600, "gzip", b"{}")
+    await asyncio.sleep(0.01)
+    assert await fake_redis.ttl(get_variant_key(REDIS_CACHED_KEY_BLOCK_HEIGHT, "gzip")) == 1
+
+
+@pytest.mark.asyncio
+@patch("sidecar.config.CONFIG.response_compression", ["gzip"])
+async def test_compressed_variant_is_not_sent_to_other_clients(test_client: TestClient) -> None:
+    response_uncached = make_request_for_block_by_height(test_client)
+
+    response = await route_get_block_by_height(block_height=10, http_request=make_request({"Accept-Encoding": "br"}))
+    assert response.body == response_uncached.content
+    assert "content-encoding" not in response.headers
+    assert response.headers["vary"] == "Accept-Encoding"
+
+
+@pytest.mark.asyncio
+async def test_not_modified(test_client: TestClient) -> None:
+    response = make_request_for_block_by_hash(test_client)
+    etag = response.headers["etag"]
+    flexmock(NODE_ADAPTER).should_receive("get_block_by_hash").never()
+
+    response_not_modified = test_client.get("/v1.0/blocks/hash", headers={"If-None-Match": f'"other", {etag}'})
+    assert response_not_modified.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response_not_modified.headers["etag"] == etag
+    assert response_not_modified.content == b""
+
+
+@pytest.mark.asyncio
+async def test_block_by_height_has_no_etag(test_client: TestClient) -> None:
+    response = make_request_for_block_by_height(test_client)
+    assert "etag" not in response.headers
+
+
+@pytest.mark.asyncio
+@patch("sidecar.config.CONFIG.cache_ttl_confirmed", 0)
+async def test_confirmed_block_is_stored_without_expiry(test_client: TestClient, fake_redis: FakeRedis) -> None:
+    TIP.update(BLOCK.height + 1000)
+    make_request_for_block_by_hash(test_client)
+    assert await fake_redis.ttl(REDIS_CACHED_KEY_BLOCK_HASH) == -1
+
+    MEMORY_CACHE.clear()
+    make_request_for_block_by_hash(test_client)
+    await asyncio.sleep(0.01)
+    assert await fake_redis.ttl(REDIS_CACHED_KEY_BLOCK_HASH) == -1  # not shortened by the hit
+
+
+@pytest.mark.asyncio
+@patch("sidecar.config.CONFIG.cache_ttl_near_tip", 5)
+async def test_block_near_tip_expires_soon(test_client: TestClient, fake_redis: FakeRedis) -> None:
+    TIP.update(BLOCK.height)
+    make_request_for_block_by_height(test_client)
+    assert 0 < await fake_redis.ttl(REDIS_CACHED_KEY_BLOCK_HEIGHT) <= 5
+
+
+@pytest.mark.asyncio
+async def test_block_by_height_answers_lookup_by_hash(test_client: TestClient, fake_redis: FakeRedis) -> None:
+    response_by_height = make_request_for_block_by_height(test_client)
+    block_key = f"ethereum/cache/route_get_block_by_hash(block_hash={BLOCK.hash})"
+    assert await fake_redis.get(block_key) == make_alias(REDIS_CACHED_KEY_BLOCK_HEIGHT, BLOCK.hash)
+    assert await get_cached_many([block_key]) == [response_by_height.content]
+
+    flexmock(NODE_ADAPTER).should_receive("get_block_by_hash").never()
+    response_by_hash = test_client.get(f"/v1.0/blocks/{BLOCK.hash}")
+    assert response_by_hash.content == response_by_height.content
+    assert await fake_redis.ttl(block_key) <= await fake_redis.ttl(REDIS_CACHED_KEY_BLOCK_HEIGHT)
+
+
+@pytest.mark.asyncio
+async def test_expired_alias_is_a_miss(test_client: TestClient, fake_redis: FakeRedis) -> None:
+    await fake_redis.set(REDIS_CACHED_KEY_BLOCK_HASH, make_alias(REDIS_CACHED_KEY_BLOCK_HEIGHT, "hash"))
+    response = make_request_for_block_by_hash(test_client)
+    assert await fake_redis.get(REDIS_CACHED_KEY_BLOCK_HASH) == response.content
+
+
+@pytest.mark.asyncio
+async def test_alias_to_other_block_is_a_miss(test_client: TestClient, fake_redis: FakeRedis) -> None:
+    await fake_redis.set(REDIS_CACHED_KEY_BLOCK_HEIGHT, b'{"height":10,"hash":"other"}')
+    await fake_redis.set(REDIS_CACHED_KEY_BLOCK_HASH, make_alias(REDIS_CACHED_KEY_BLOCK_HEIGHT, "hash"))
+    assert await get_cached_many([REDIS_CACHED_KEY_BLOCK_HASH]) == [None]
+
+    response = make_request_for_block_by_hash(test_client)
+    assert await fake_redis.get(REDIS_CACHED_KEY_BLOCK_HASH) == response.content
+
+
+@pytest.mark.asyncio
+async def test_alias_of_replaced_block_is_deleted(test_client: TestClient, fake_redis: FakeRedis) -> None:
+    make_request_for_block_by_height(test_client)
+    block_key = f"ethereum/cache/route_get_block_by_hash(block_hash={BLOCK.hash})"
+    assert await fake_redis.get(block_key)
+
+    # the block at the height is replaced by a reorg
+    await fake_redis.delete(REDIS_CACHED_KEY_BLOCK_HEIGHT)
+    flexmock(PARSER).should_receive("decode_block").and_return(AwaitableValue(BLOCK.copy(update={"hash": "other"})))
+    assert test_client.get("/v1.0/blocks/10").status_code == status.HTTP_200_OK
+
+    assert await fake_redis.get(block_key) is None
+    other_key = "ethereum/cache/route_get_block_by_hash(block_hash=other)"
+    assert await fake_redis.get(other_key) == make_alias(REDIS_CACHED_KEY_BLOCK_HEIGHT, "other")
+
+
+@pytest.mark.asyncio
+async def test_alias_and_its_variants_are_not_extended(fake_redis: FakeRedis) -> None:
+    await fake_redis.set(REDIS_CACHED_KEY_BLOCK_HASH, make_alias(REDIS_CACHED_KEY_BLOCK_HEIGHT, "hash"), ex=10)
+    await fake_redis.set(get_variant_key(REDIS_CACHED_KEY_BLOCK_HASH, "gzip"), b"variant", ex=10)
+
+    await extend_expiry(REDIS_CACHED_KEY_BLOCK_HASH, get_variant_key(REDIS_CACHED_KEY_BLOCK_HASH, "gzip"), seconds=600)
+
+    assert await fake_redis.ttl(REDIS_CACHED_KEY_BLOCK_HASH) <= 10
+    assert await fake_redis.ttl(get_variant_key(REDIS_CACHED_KEY_BLOCK_HASH, "gzip")) <= 10
+
+
+@pytest.mark.asyncio
+async def test_block_with_full_transactions_answers_transaction_lookups(
+    test_client: TestClient, fake_redis: FakeRedis
+) -> None:
+    block = BLOCK.copy(update={"transactions": [TRANSACTION]})
+    flexmock(NODE_ADAPTER).should_receive("get_block_by_height").and_return(AwaitableValue(BLOCK_DICT)).once()
+    flexmock(PARSER).should_receive("decode_block").and_return(AwaitableValue(block)).once()
+    assert test_client.get("/v1.0/blocks/10").status_code == status.HTTP_200_OK
+
+    flexmock(NODE_ADAPTER).should_receive("get_transaction").never()
+    response = test_client.get(f"/v1.0/transactions/{TRANSACTION.hash}")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["hash"] == TRANSACTION.hash
+
+
+@pytest.mark.asyncio
+@patch("sidecar.config.CONFIG.cache_stale_ttl", 100)
+async def test_entry_is_kept_after_expiry(test_client: TestClient, fake_redis: FakeRedis) -> None:
+    TIP.update(BLOCK.height)
+    make_request_for_block_by_height(test_client)
+    assert 100 < await fake_redis.ttl(REDIS_CACHED_KEY_BLOCK_HEIGHT) <= 100 + CONFIG.cache_ttl_near_tip
+
+
+@pytest.mark.asyncio
+@patch("sidecar.config.CONFIG.cache_stale_ttl", 100)
+async def test_stale_entry_is_served_and_refreshed(test_client: TestClient, fake_redis: FakeRedis) -> None:
+    await fake_redis.set(REDIS_CACHED_KEY_BLOCK_HEIGHT, b'{"stale":true}', ex=50)
+    flexmock(NODE_ADAPTER).should_receive("get_block_by_height").and_return(AwaitableValue(BLOCK_DICT)).once()
+    flexmock(PARSER).should_receive("decode_block").with_args(BLOCK_DICT).and_return(AwaitableValue(BLOCK)).once()
+
+    response = await route_get_block_by_height(block_height=10, http_request=make_request({}))
+    assert response.body == b'{"stale":true}'
+    assert response.headers["x-cache-stale"] == "true"
+
+    await asyncio.sleep(0.01)
+    assert await fake_redis.get(REDIS_CACHED_KEY_BLOCK_HEIGHT) != b'{"stale":true}'
+    assert await fake_redis.ttl(REDIS_CACHED_KEY_BLOCK_HEIGHT) > 100
+
+
+@pytest.mark.asyncio
+@patch("sidecar.config.CONFIG.cache_stale_ttl", 100)
+async def test_stale_entry_is_served_when_node_is_unavailable(test_client: TestClient, fake_redis: FakeRedis) -> None:
+    await fake_redis.set(REDIS_CACHED_KEY_BLOCK_HEIGHT, b'{"stale":true}', ex=50)
+    flexmock(NODE_ADAPTER).should_receive("get_block_by_height").and_raise(Unavailable).once()
+
+    for _ in range(2):
+        response = await route_get_block_by_height(block_height=10)
+        assert response.body == b'{"stale":true}'
+        await asyncio.sleep(0.01)
+
+    # the other refresh is not attempted before cache_stale_refresh_interval
+    assert await fake_redis.get(REDIS_CACHED_KEY_BLOCK_HEIGHT) == b'{"stale":true}'
+
+
+@pytest.mark.asyncio
+@patch("sidecar.config.CONFIG.cache_stale_ttl", 100)
+async def test_fresh_entry_is_not_refreshed(test_client: TestClient, fake_redis: FakeRedis) -> None:
+    await fake_redis.set(REDIS_CACHED_KEY_BLOCK_HEIGHT, b"{}", ex=500)
+    flexmock(NODE_ADAPTER).should_receive("get_block_by_height").never()
+
+    response = await route_get_block_by_height(block_height=10)
+    assert response.body == b"{}"
+    assert "x-cache-stale" not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_missing_block_is_cached(test_client: TestClient, fake_redis: FakeRedis) -> None:
+    flexmock(NODE_ADAPTER).should_receive("get_block_by_height").and_raise(DoesNotExist).once()
+
+    for _ in range(2):
+        response = test_client.get("/v1.0/blocks/10")
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    assert 0 < await fake_redis.ttl(REDIS_CACHED_KEY_BLOCK_HEIGHT) <= CONFIG.cache_negative_ttl
+
+
+@pytest.mark.asyncio
+async def test_missing_block_is_fetched_again_when_tip_advances(test_client: TestClient, fake_redis: FakeRedis) -> None:
+    TIP.update(9)
+    flexmock(NODE_ADAPTER).should_receive("get_block_by_height").and_raise(DoesNotExist).and_return(
+        AwaitableValue(BLOCK_DICT)
+    ).twice()
+    flexmock(PARSER).should_receive("decode_block").with_args(BLOCK_DICT).and_return(AwaitableValue(BLOCK)).once()
+
+    assert test_client.get("/v1.0/blocks/10").status_code == status.HTTP_404_NOT_FOUND
+    assert test_client.get("/v1.0/blocks/10").status_code == status.HTTP_404_NOT_FOUND
+
+    TIP.update(10)
+    assert test_client.get("/v1.0/blocks/10").status_code == status.HTTP_200_OK
+
+
+@pytest.mark.asyncio
+@patch("sidecar.config.CONFIG.cache_negative_ttl", 0)
+async def test_missing_block_is_not_cached_when_disabled(test_client: TestClient, fake_redis: FakeRedis) -> None:
+    flexmock(NODE_ADAPTER).should_receive("get_block_by_height").and_raise(DoesNotExist).once()
+    assert test_client.get("/v1.0/blocks/10").status_code == status.HTTP_404_NOT_FOUND
+    assert await fake_redis.get(REDIS_CACHED_KEY_BLOCK_HEIGHT) is None
+
+
+@pytest.mark.asyncio
+@patch("sidecar.config.CONFIG.cache_lock_enabled", True)  # stored before the response is returned
+async def test_confirmed_block_is_served_from_disk(test_client: TestClient, fake_redis: FakeRedis, tmp_path) -> None:
+    TIP.update(BLOCK.height + 1000)
+    with patch("sidecar.block_store.BLOCK_STORE", BlockStore(str(tmp_path), 1024 * 1024, get_block_store_prefixes())):
+        response_uncached = make_request_for_block_by_height(test_client)
+        await fake_redis.flushall()
+        flexmock(NODE_ADAPTER).should_receive("get_block_by_height").never()
+        flexmock(NODE_ADAPTER).should_receive("get_block_by_hash").never()
+
+        response_cached = test_client.get("/v1.0/blocks/10")
+        assert response_cached.content == response_uncached.content
+        assert test_client.get(f"/v1.0/blocks/{BLOCK.hash}").content == response_uncached.content
+
+
+@pytest.mark.asyncio
+@patch("sidecar.config.CONFIG.cache_lock_enabled", True)
+async def test_block_near_tip_is_not_written_to_disk(test_client: TestClient, tmp_path) -> None:
+    TIP.update(BLOCK.height)
+    store = BlockStore(str(tmp_path), 1024 * 1024, get_block_store_prefixes())
+    with patch("sidecar.block_store.BLOCK_STORE", store):
+        make_request_for_block_by_height(test_client)
+        assert store.get(REDIS_CACHED_KEY_BLOCK_HEIGHT) is None
+
+
+@pytest.mark.asyncio
+async def test_depth_is_computed_once(test_client: TestClient, tmp_path) -> None:
+    flexmock(NODE_ADAPTER).should_receive("get_block_count").and_raise(Unavailable).once()
+    with patch("sidecar.block_store.BLOCK_STORE", BlockStore(str(tmp_path), 1024 * 1024, get_block_store_prefixes())):
+        make_request_for_block_by_height(test_client)
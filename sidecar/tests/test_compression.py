@@ -0,0 +1,59 @@
+import gzip
+from unittest.mock import patch
+
+import pytest
+
+from sidecar.compression import (
+    MARKERS,
+    choose_response_encoding,
+    compress_value,
+    decompress_value,
+    encode_response,
+    get_accepted_encodings,
+    split_value,
+)
+
+VALUE = b'{"height":10,"transactions":[]}' * 100
+
+
+@pytest.mark.parametrize("encoding", ["zstd", "lz4"])
+def test_compress_value(encoding: str) -> None:
+    with patch("sidecar.config.CONFIG.cache_compression", encoding):
+        compressed = compress_value(VALUE)
+
+    assert compressed[:1] == MARKERS[encoding]
+    assert len(compressed) < len(VALUE)
+    assert split_value(compressed)[0] == encoding
+    assert decompress_value(compressed) == VALUE
+
+
+def test_small_value_is_not_compressed() -> None:
+    with patch("sidecar.config.CONFIG.cache_compression", "zstd"):
+        assert compress_value(b"{}") == b"{}"
+
+
+def test_uncompressed_value() -> None:
+    assert compress_value(VALUE) == VALUE
+    assert split_value(VALUE) == (None, VALUE)
+    assert decompress_value(VALUE) == VALUE
+
+
+def test_get_accepted_encodings() -> None:
+    assert get_accepted_encodings("gzip, br;q=0.5, zstd;q=0, ZSTD") == ["gzip", "br", "zstd"]
+    assert get_accepted_encodings(None) == []
+    assert get_accepted_encodings("") == []
+    assert get_accepted_encodings("gzip,, ") == ["gzip"]
+
+
+def test_encode_response() -> None:
+    assert gzip.decompress(encode_response(VALUE, "gzip")) == VALUE
+
+
+@patch("sidecar.config.CONFIG.response_compression", ["br", "gzip"])
+def test_choose_response_encoding() -> None:
+    assert choose_response_encoding("gzip, br", None) == "br"
+    assert choose_response_encoding("gzip, br;q=0", None) == "gzip"
+    assert choose_response_encoding("deflate", None) is None
+    # zstd values are sent as they are
+    assert choose_response_encoding("gzip, zstd", "zstd") is None
+    assert choose_response_encoding("gzip", "zstd") == "gzip"
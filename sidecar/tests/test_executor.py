@@ -0,0 +1,72 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List
+from unittest.mock import patch
+
+import pytest
+from flexmock import flexmock
+from genesis.encoders import fast_serializer_to_bytes
+from pydantic import BaseModel
+
+import sidecar.executor
+from sidecar.executor import count_transactions, decode_block, serialize, should_offload
+from sidecar.node_limiter import get_limiter
+
+
+class Block(BaseModel):
+    height: int
+    transactions: List[str]
+
+
+@pytest.mark.parametrize(
+    "data, count",
+    [
+        (dict(transactions=["a", "b"]), 2),
+        (dict(tx=["a"]), 1),
+        (dict(), 0),
+        (Block(height=1, transactions=["a", "b", "c"]), 3),
+    ],
+)
+def test_count_transactions(data, count: int) -> None:
+    assert count_transactions(data) == count
+
+
+@patch("sidecar.config.CONFIG.executor_min_transactions", 2)
+def test_should_offload() -> None:
+    assert not should_offload(dict(transactions=["a", "b"]))
+
+    with patch("sidecar.executor.EXECUTOR", object()):
+        assert should_offload(dict(transactions=["a", "b"]))
+        assert not should_offload(dict(transactions=["a"]))
+
+
+@pytest.mark.asyncio
+@patch("sidecar.config.CONFIG.executor_min_transactions", 1)
+async def test_offloaded_decode_takes_node_call_slot() -> None:
+    block = Block(height=1, transactions=["a"])
+
+    async def run_in_executor(_func: Callable, raw_block: Dict) -> Block:
+        assert get_limiter("decode_block").in_progress.value == 1
+        return Block(**raw_block)
+
+    with patch("sidecar.executor.EXECUTOR", object()), patch("sidecar.executor.run_in_executor", run_in_executor):
+        assert await decode_block(block.dict()) == block
+    assert get_limiter("decode_block").in_progress.value == 0
+
+
+@pytest.mark.asyncio
+@patch("sidecar.config.CONFIG.executor_min_transactions", 1)
+async def test_serialize_in_executor() -> None:
+    block = Block(height=1, transactions=["a"])
+
+    with ProcessPoolExecutor(max_workers=1) as executor, patch("sidecar.executor.EXECUTOR", executor):
+        assert await serialize(block) == fast_serializer_to_bytes(block.dict())
+
+
+@pytest.mark.asyncio
+@patch("sidecar.config.CONFIG.executor_min_transactions", 2)
+async def test_small_response_is_serialized_in_place() -> None:
+    block = Block(height=1, transactions=["a"])
+    flexmock(sidecar.executor).should_receive("run_in_executor").never()
+
+    with patch("sidecar.executor.EXECUTOR", object()):
+        assert await serialize(block) == fast_serializer_to_bytes(block.dict())
@@ -1,14 +1,24 @@
 import time
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 import pytest
 from fakeredis.aioredis import FakeRedis
 from fastapi import status
 from fastapi.testclient import TestClient
+from flexmock import flexmock
 from genesis.blockchain.tests.utils import AwaitableValue
 
+from sidecar.auth import API_KEYS_CACHE
 from sidecar.config import CONFIG
-from sidecar.limits import broadcast_limit_consumption, get_limits_key
+from sidecar.limits import (
+    LEASES,
+    PENDING_LIMIT_SYNC,
+    broadcast_limit_consumption,
+    close_sync_session,
+    get_limits_key,
+    queue_limit_consumption,
+    release_unused_leases,
+)
 from sidecar.models import Limit
 from sidecar.tests.utils import make_request_for_block_by_hash
 
@@ -80,8 +90,8 @@ async def test_limits_expire(test_client: TestClient, fake_redis: FakeRedis) ->
 
 
 @pytest.mark.asyncio
-@patch("sidecar.limits.broadcast_limit_consumption")
-async def test_trigger_post_limit(mock, test_client: TestClient, fake_redis: FakeRedis) -> None:
+@patch("sidecar.config.CONFIG.sidecar_urls", set(["https://sidecar"]))
+async def test_trigger_post_limit(test_client: TestClient, fake_redis: FakeRedis) -> None:
     limit_key = get_limits_key(
         api_key=None, client_ip="testclient", blockchain_name=CONFIG.node_blockchain.blockchain_name
     )
@@ -89,12 +99,12 @@ async def test_trigger_post_limit(mock, test_client: TestClient, fake_redis: Fak
     await fake_redis.expire(limit_key, 1_000_000)
     make_request_for_block_by_hash(test_client)
 
-    mock.assert_called_with(limit_key)
+    assert PENDING_LIMIT_SYNC == {limit_key: CONFIG.sidecar_limit_sync_interval}
 
 
 @pytest.mark.asyncio
-@patch("sidecar.limits.broadcast_limit_consumption")
-async def test_trigger_post_limit_shouldnt_be_called(mock, test_client: TestClient, fake_redis: FakeRedis) -> None:
+@patch("sidecar.config.CONFIG.sidecar_urls", set(["https://sidecar"]))
+async def test_trigger_post_limit_shouldnt_be_called(test_client: TestClient, fake_redis: FakeRedis) -> None:
     limit_key = get_limits_key(
         api_key=None, client_ip="testclient", blockchain_name=CONFIG.node_blockchain.blockchain_name
     )
@@ -102,7 +112,7 @@ async def test_trigger_post_limit_shouldnt_be_called(mock, test_client: TestClie
     await fake_redis.expire(limit_key, 1_000_000)
     make_request_for_block_by_hash(test_client)
 
-    mock.assert_not_called()
+    assert not PENDING_LIMIT_SYNC
 
 
 @pytest.mark.asyncio
@@ -144,16 +154,151 @@ async def test_post_limit_keep_ttl(test_client: TestClient, fake_redis: FakeRedi
 
 
 @pytest.mark.asyncio
-@patch("sidecar.limits.aiohttp.ClientSession.post", return_value=AwaitableValue(None))
+async def test_post_limit_batch(test_client: TestClient, fake_redis: FakeRedis) -> None:
+    await fake_redis.set("a", 1, ex=1_000_000)
+    test_client.post(
+        "/limit",
+        json=[Limit(key="a", value=10, ttl=100).dict(), Limit(key="b", value=20, ttl=1_000).dict()],
+        headers={"Authorization": f"Bearer {CONFIG.sidecar_token}"},
+    )
+    assert await fake_redis.get("a") == b"11"
+    assert 0 <= await fake_redis.ttl("a") <= 100
+    assert await fake_redis.get("b") == b"20"
+    assert 0 < await fake_redis.ttl("b") <= 1_000
+
+
+@pytest.mark.asyncio
+@patch("sidecar.limits.aiohttp.ClientSession.post", return_value=AwaitableValue(MagicMock()))
 async def test_broadcast_limit_consumption(mock, test_client: TestClient, fake_redis: FakeRedis):
     await fake_redis.set("a", CONFIG.sidecar_limit_sync_interval, ex=1_000_000)
-    with patch("sidecar.config.CONFIG.sidecar_urls", set(["https://sidecar"])):
-        await broadcast_limit_consumption("a")
+    await fake_redis.set("b", 2 * CONFIG.sidecar_limit_sync_interval, ex=1_000)
+    await fake_redis.set("expired", CONFIG.sidecar_limit_sync_interval)
+    with patch("sidecar.config.CONFIG.sidecar_urls", set(["https://sidecar", "https://other-sidecar"])):
+        queue_limit_consumption("a", previous_usage=0, usage=CONFIG.sidecar_limit_sync_interval)
+        queue_limit_consumption("b", previous_usage=0, usage=2 * CONFIG.sidecar_limit_sync_interval)
+        queue_limit_consumption("expired", previous_usage=0, usage=CONFIG.sidecar_limit_sync_interval)
+        await broadcast_limit_consumption()
+    await close_sync_session()
+
+    for sidecar_url in ["https://sidecar", "https://other-sidecar"]:
+        mock.assert_any_call(
+            url=f"{sidecar_url}/limit",
+            json=[
+                dict(key="a", value=CONFIG.sidecar_limit_sync_interval, ttl=1_000_000),
+                dict(key="b", value=2 * CONFIG.sidecar_limit_sync_interval, ttl=1_000),
+            ],
+            headers={"Authorization": f"Bearer {CONFIG.sidecar_token}"},
+            raise_for_status=True,
+            allow_redirects=False,
+        )
+    assert mock.call_count == 2
+    assert not PENDING_LIMIT_SYNC
 
-    mock.assert_called_with(
-        url="https://sidecar/limit",
-        json=dict(key="a", value=CONFIG.sidecar_limit_sync_interval, ttl=1_000_000),
-        headers={"Authorization": f"Bearer {CONFIG.sidecar_token}"},
-        raise_for_status=True,
-        allow_redirects=False,
+
+@pytest.mark.asyncio
+@patch("sidecar.config.CONFIG.limit_default", 2)
+async def test_limits_rejected_request_is_not_counted(test_client: TestClient, fake_redis: FakeRedis) -> None:
+    limit_key = get_limits_key(
+        api_key=None, client_ip="testclient", blockchain_name=CONFIG.node_blockchain.blockchain_name
+    )
+    await fake_redis.set(limit_key, 2, ex=100)
+
+    response = make_request_for_block_by_hash(test_client, expected_status_code=status.HTTP_429_TOO_MANY_REQUESTS)
+
+    assert await fake_redis.get(limit_key) == b"2"
+    assert 0 < int(response.headers["Retry-After"]) <= 100
+
+
+@pytest.mark.asyncio
+async def test_limits_set_expiry_on_key_without_ttl(test_client: TestClient, fake_redis: FakeRedis) -> None:
+    limit_key = get_limits_key(
+        api_key=None, client_ip="testclient", blockchain_name=CONFIG.node_blockchain.blockchain_name
+    )
+    await fake_redis.set(limit_key, 1)
+
+    make_request_for_block_by_hash(test_client)
+
+    assert await fake_redis.get(limit_key) == b"2"
+    assert 0 < await fake_redis.ttl(limit_key) <= CONFIG.limit_interval
+
+
+@pytest.mark.asyncio
+@patch("sidecar.config.CONFIG.limit_lease_size", 10)
+async def test_limits_served_from_lease(test_client: TestClient, fake_redis: FakeRedis) -> None:
+    limit_key = get_limits_key(
+        api_key=None, client_ip="testclient", blockchain_name=CONFIG.node_blockchain.blockchain_name
+    )
+
+    make_request_for_block_by_hash(test_client)
+    assert await fake_redis.get(limit_key) == b"10"
+    assert LEASES[limit_key].remaining == 9
+
+    make_request_for_block_by_hash(test_client)
+    assert await fake_redis.get(limit_key) == b"10"
+    assert LEASES[limit_key].remaining == 8
+
+
+@pytest.mark.asyncio
+@patch("sidecar.config.CONFIG.limit_lease_size", 10)
+@patch("sidecar.config.CONFIG.limit_default", 12)
+async def test_limits_exact_close_to_limit(test_client: TestClient, fake_redis: FakeRedis) -> None:
+    limit_key = get_limits_key(
+        api_key=None, client_ip="testclient", blockchain_name=CONFIG.node_blockchain.blockchain_name
     )
+
+    for _ in range(10):
+        make_request_for_block_by_hash(test_client)
+    assert await fake_redis.get(limit_key) == b"10"
+
+    make_request_for_block_by_hash(test_client)
+    make_request_for_block_by_hash(test_client)
+    assert await fake_redis.get(limit_key) == b"12"
+
+    make_request_for_block_by_hash(test_client, expected_status_code=status.HTTP_429_TOO_MANY_REQUESTS)
+
+
+@pytest.mark.asyncio
+@patch("sidecar.config.CONFIG.limit_lease_size", 10)
+async def test_release_unused_leases(test_client: TestClient, fake_redis: FakeRedis) -> None:
+    limit_key = get_limits_key(
+        api_key=None, client_ip="testclient", blockchain_name=CONFIG.node_blockchain.blockchain_name
+    )
+    make_request_for_block_by_hash(test_client)
+    make_request_for_block_by_hash(test_client)
+
+    await release_unused_leases()
+
+    assert await fake_redis.get(limit_key) == b"2"
+    assert not LEASES
+
+
+@pytest.mark.asyncio
+async def test_api_key_is_looked_up_together_with_limits(test_client: TestClient, fake_redis: FakeRedis) -> None:
+    API_KEY = "testclientkey"
+    limit_key = get_limits_key(
+        api_key=API_KEY, client_ip="testclient", blockchain_name=CONFIG.node_blockchain.blockchain_name
+    )
+    await fake_redis.hset(CONFIG.api_key_hash, API_KEY, 1)
+    flexmock(fake_redis).should_receive("hget").never()
+
+    make_request_for_block_by_hash(test_client, api_key_query=API_KEY)
+    assert await fake_redis.get(limit_key) == b"1"
+    cached = API_KEYS_CACHE.get(API_KEY)
+    assert cached is not None and cached[0] == b"1"
+
+    make_request_for_block_by_hash(
+        test_client, api_key_query=API_KEY, expected_status_code=status.HTTP_429_TOO_MANY_REQUESTS
+    )
+
+
+@pytest.mark.asyncio
+async def test_unlimited_api_key_is_not_counted(test_client: TestClient, fake_redis: FakeRedis) -> None:
+    API_KEY = "testclientkey"
+    limit_key = get_limits_key(
+        api_key=API_KEY, client_ip="testclient", blockchain_name=CONFIG.node_blockchain.blockchain_name
+    )
+    await fake_redis.hset(CONFIG.api_key_hash, API_KEY, "inf")
+
+    make_request_for_block_by_hash(test_client, api_key_query=API_KEY)
+    make_request_for_block_by_hash(test_client, api_key_query=API_KEY)
+    assert await fake_redis.get(limit_key) is None
@@ -0,0 +1,42 @@
+from sidecar.memory_cache import MemoryCache
+
+
+def test_get() -> None:
+    cache = MemoryCache(max_size=10, max_item_size=10)
+    cache.set("a", b"1")
+
+    assert cache.get("a") == b"1"
+    assert cache.get("b") is None
+    assert len(cache) == 1
+    assert cache.size == 1
+
+
+def test_evicts_least_recently_used() -> None:
+    cache = MemoryCache(max_size=8, max_item_size=8)
+    cache.set("a", b"123")
+    cache.set("b", b"123")
+    cache.get("a")
+    cache.set("c", b"123")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == b"123"
+    assert cache.get("c") == b"123"
+    assert cache.size == 6
+    assert cache.evictions == 1
+
+
+def test_does_not_store_too_large_items() -> None:
+    cache = MemoryCache(max_size=10, max_item_size=2)
+    cache.set("a", b"123")
+
+    assert cache.get("a") is None
+    assert cache.size == 0
+
+
+def test_replacing_value_updates_size() -> None:
+    cache = MemoryCache(max_size=10, max_item_size=10)
+    cache.set("a", b"123")
+    cache.set("a", b"12")
+
+    assert len(cache) == 1
+    assert cache.size == 2
@@ -0,0 +1,38 @@
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from sidecar.metrics import Counter, Histogram, render_metrics
+from sidecar.tests.utils import make_request_for_block_by_hash
+
+
+def test_render_counter() -> None:
+    counter = Counter("test_counter_total", "Test counter", {"label": "value"})
+    counter.inc(2)
+
+    assert '# TYPE test_counter_total counter\ntest_counter_total{label="value"} 2.0\n' in render_metrics()
+
+
+def test_render_histogram() -> None:
+    histogram = Histogram("test_histogram_seconds", "Test histogram", buckets=(0.1, 1.0))
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5)
+
+    rendered = render_metrics()
+    assert 'test_histogram_seconds_bucket{le="0.1"} 1\n' in rendered
+    assert 'test_histogram_seconds_bucket{le="1.0"} 2\n' in rendered
+    assert 'test_histogram_seconds_bucket{le="+Inf"} 3\n' in rendered
+    assert "test_histogram_seconds_sum 5.55\n" in rendered
+    assert "test_histogram_seconds_count 3\n" in rendered
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint(test_client: TestClient) -> None:
+    make_request_for_block_by_hash(test_client)
+
+    response = test_client.get("/metrics")
+    assert response.status_code == status.HTTP_200_OK
+    assert 'sidecar_cache_hits_total{tier="memory"}' in response.text
+    assert "sidecar_cache_misses_total" in response.text
+    assert 'sidecar_cache_redis_duration_seconds_count{command="get"}' in response.text
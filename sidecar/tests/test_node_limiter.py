@@ -0,0 +1,50 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from flexmock import flexmock
+
+from sidecar.node_limiter import AdmissionLimiter, NodeOverloaded, get_limiter
+from sidecar.tests.conftest import NODE_ADAPTER
+
+
+@pytest.mark.asyncio
+async def test_limiter_queues_calls_over_concurrency() -> None:
+    limiter = AdmissionLimiter("test", concurrency=1, queue_size=1)
+    order = []
+
+    async def call(name: str) -> None:
+        async with limiter.acquire():
+            order.append(f"{name} start")
+            await asyncio.sleep(0.01)
+            order.append(f"{name} end")
+
+    await asyncio.gather(call("first"), call("second"))
+    assert order == ["first start", "first end", "second start", "second end"]
+
+
+@pytest.mark.asyncio
+async def test_limiter_rejects_when_queue_is_full() -> None:
+    limiter = AdmissionLimiter("test", concurrency=1, queue_size=0)
+
+    async with limiter.acquire():
+        with pytest.raises(NodeOverloaded):
+            async with limiter.acquire():
+                pass
+
+    async with limiter.acquire():
+        pass
+
+
+@pytest.mark.asyncio
+async def test_node_overloaded_response(test_client: TestClient) -> None:
+    flexmock(NODE_ADAPTER).should_receive("get_transaction").never()
+    limiter = get_limiter("get_transaction")
+
+    with patch.object(limiter, "queue_size", 0), patch.object(limiter.semaphore, "locked", return_value=True):
+        response = test_client.get("/v1.0/transactions/a")
+
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.headers["Retry-After"] == "1"
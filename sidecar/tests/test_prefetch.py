@@ -0,0 +1,87 @@
+from unittest.mock import patch
+
+import pytest
+from fakeredis.aioredis import FakeRedis
+from fastapi.testclient import TestClient
+from flexmock import flexmock
+from genesis.blockchain.exceptions import DoesNotExist
+from genesis.blockchain.tests.utils import AwaitableValue
+
+from sidecar.caching import get_cache_key
+from sidecar.prefetch import get_prefetch_claim_key, prefetch_new_blocks
+from sidecar.tests.conftest import BLOCK, BLOCK_DICT, NODE_ADAPTER, PARSER
+
+
+def get_block_cache_key(height: int) -> str:
+    return get_cache_key(f"route_get_block_by_height(block_height={height})")
+
+
+@pytest.mark.asyncio
+async def test_prefetch_first_run_fetches_tip(test_client: TestClient, fake_redis: FakeRedis) -> None:
+    flexmock(NODE_ADAPTER).should_receive("get_block_count").and_return(AwaitableValue(10)).once()
+    flexmock(NODE_ADAPTER).should_receive("get_block_by_height").with_args(height=10).and_return(
+        AwaitableValue(BLOCK_DICT)
+    ).once()
+    flexmock(PARSER).should_receive("decode_block").with_args(BLOCK_DICT).and_return(AwaitableValue(BLOCK)).once()
+
+    assert await prefetch_new_blocks(None) == 10
+    assert await fake_redis.get(get_block_cache_key(10)) is not None
+
+
+@pytest.mark.asyncio
+async def test_prefetch_fetches_new_blocks(test_client: TestClient, fake_redis: FakeRedis) -> None:
+    flexmock(NODE_ADAPTER).should_receive("get_block_count").and_return(AwaitableValue(12)).once()
+    flexmock(NODE_ADAPTER).should_receive("get_block_by_height").and_return(AwaitableValue(BLOCK_DICT)).twice()
+    flexmock(PARSER).should_receive("decode_block").with_args(BLOCK_DICT).and_return(AwaitableValue(BLOCK)).twice()
+
+    assert await prefetch_new_blocks(10) == 12
+    assert await fake_redis.get(get_block_cache_key(11)) is not None
+    assert await fake_redis.get(get_block_cache_key(12)) is not None
+
+
+@pytest.mark.asyncio
+async def test_prefetch_skips_blocks_claimed_by_other_worker(test_client: TestClient, fake_redis: FakeRedis) -> None:
+    await fake_redis.set(get_prefetch_claim_key(11), 1)
+    flexmock(NODE_ADAPTER).should_receive("get_block_count").and_return(AwaitableValue(11)).once()
+    flexmock(NODE_ADAPTER).should_receive("get_block_by_height").never()
+
+    assert await prefetch_new_blocks(10) == 11
+
+
+@pytest.mark.asyncio
+@patch("sidecar.config.CONFIG.prefetch_max_blocks", 2)
+async def test_prefetch_limits_number_of_blocks(test_client: TestClient, fake_redis: FakeRedis) -> None:
+    flexmock(NODE_ADAPTER).should_receive("get_block_count").and_return(AwaitableValue(100)).once()
+    flexmock(NODE_ADAPTER).should_receive("get_block_by_height").and_return(AwaitableValue(BLOCK_DICT)).twice()
+    flexmock(PARSER).should_receive("decode_block").with_args(BLOCK_DICT).and_return(AwaitableValue(BLOCK)).twice()
+
+    assert await prefetch_new_blocks(10) == 100
+    assert await fake_redis.get(get_block_cache_key(99)) is not None
+    assert await fake_redis.get(get_block_cache_key(100)) is not None
+
+
+@pytest.mark.asyncio
+async def test_prefetch_continues_after_failed_block(test_client: TestClient, fake_redis: FakeRedis) -> None:
+    flexmock(NODE_ADAPTER).should_receive("get_block_count").and_return(AwaitableValue(12)).once()
+    flexmock(NODE_ADAPTER).should_receive("get_block_by_height").with_args(height=11).and_raise(ValueError).once()
+    flexmock(NODE_ADAPTER).should_receive("get_block_by_height").with_args(height=12).and_return(
+        AwaitableValue(BLOCK_DICT)
+    ).once()
+    flexmock(PARSER).should_receive("decode_block").with_args(BLOCK_DICT).and_return(AwaitableValue(BLOCK)).once()
+
+    assert await prefetch_new_blocks(10) == 10
+    assert await fake_redis.get(get_prefetch_claim_key(11)) is None
+    assert await fake_redis.get(get_block_cache_key(12)) is not None
+
+
+@pytest.mark.asyncio
+async def test_prefetch_advances_past_missing_block(test_client: TestClient, fake_redis: FakeRedis) -> None:
+    flexmock(NODE_ADAPTER).should_receive("get_block_count").and_return(AwaitableValue(12)).once()
+    flexmock(NODE_ADAPTER).should_receive("get_block_by_height").with_args(height=11).and_raise(DoesNotExist).once()
+    flexmock(NODE_ADAPTER).should_receive("get_block_by_height").with_args(height=12).and_return(
+        AwaitableValue(BLOCK_DICT)
+    ).once()
+    flexmock(PARSER).should_receive("decode_block").with_args(BLOCK_DICT).and_return(AwaitableValue(BLOCK)).once()
+
+    assert await prefetch_new_blocks(10) == 12
+    assert await fake_redis.get(get_block_cache_key(12)) is not None
@@ -2,6 +2,7 @@ from typing import Type
 from unittest.mock import patch
 
 import pytest
+from fakeredis.aioredis import FakeRedis
 from fastapi import status
 from fastapi.testclient import TestClient
 from flexmock import flexmock
@@ -22,17 +23,19 @@ from sidecar.tests.conftest import (
     TRANSACTION,
     TRANSACTION_DICT,
 )
+from sidecar.tip import TIP
 
 
 @pytest.mark.asyncio
 async def test_get_status_ok(test_client: TestClient) -> None:
     flexmock(NODE_ADAPTER).should_receive("get_block_count").with_args().and_return(AwaitableValue(1)).once()
-    flexmock(NODE_ADAPTER).should_receive("get_block_by_height").with_args(1).and_return(
-        AwaitableValue(BLOCK_DICT)
-    ).once()
-    flexmock(PARSER).should_receive("decode_block").with_args(
-        BLOCK_DICT,
-    ).and_return(AwaitableValue(BLOCK)).once()
+    flexmock(NODE_ADAPTER).should_receive("get_block_by_height").never()
+    response = test_client.get("/v1.0/status")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["status"] == "ok"
+    assert response.json()["redis"] == "ok"
+    assert response.json()["height"] == 1
+
     response = test_client.get("/v1.0/status")
     assert response.status_code == status.HTTP_200_OK
 
@@ -44,6 +47,42 @@ async def test_get_status_ko(test_client: TestClient) -> None:
     assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
 
 
+@pytest.mark.asyncio
+@patch("sidecar.config.CONFIG.status_max_tip_lag", 10)
+async def test_get_status_ko_tip_not_advancing(test_client: TestClient) -> None:
+    TIP.update(1)
+    TIP.changed_at -= 100
+    flexmock(NODE_ADAPTER).should_receive("get_block_count").never()
+    response = test_client.get("/v1.0/status")
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.json()["tip_lag"] >= 100
+
+
+@pytest.mark.asyncio
+async def test_get_status_tip_lag_check_disabled(test_client: TestClient) -> None:
+    TIP.update(1)
+    TIP.changed_at -= 100
+    flexmock(NODE_ADAPTER).should_receive("get_block_count").never()
+    response = test_client.get("/v1.0/status")
+    assert response.status_code == status.HTTP_200_OK
+
+
+@pytest.mark.asyncio
+async def test_get_status_ko_redis_unavailable(test_client: TestClient, fake_redis: FakeRedis) -> None:
+    flexmock(NODE_ADAPTER).should_receive("get_block_count").and_return(AwaitableValue(1))
+    flexmock(fake_redis).should_receive("ping").and_raise(ConnectionError)
+    response = test_client.get("/v1.0/status")
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.json()["redis"] == "ko"
+
+
+@pytest.mark.asyncio
+async def test_get_status_live(test_client: TestClient) -> None:
+    flexmock(NODE_ADAPTER).should_receive("get_block_count").never()
+    response = test_client.get("/v1.0/status/live")
+    assert response.status_code == status.HTTP_200_OK
+
+
 @pytest.mark.asyncio
 async def test_get_block_latest(test_client: TestClient) -> None:
     flexmock(NODE_ADAPTER).should_receive("get_block_count").with_args().and_return(AwaitableValue(1)).once()
@@ -58,6 +97,33 @@ async def test_get_block_latest(test_client: TestClient) -> None:
     assert response.status_code == status.HTTP_200_OK
 
 
+@pytest.mark.asyncio
+async def test_get_block_latest_cached(test_client: TestClient) -> None:
+    flexmock(NODE_ADAPTER).should_receive("get_block_count").with_args().and_return(AwaitableValue(1)).once()
+    flexmock(NODE_ADAPTER).should_receive("get_block_by_height").with_args(1).and_return(
+        AwaitableValue(BLOCK_DICT)
+    ).once()
+    flexmock(PARSER).should_receive("decode_block").with_args(BLOCK_DICT).and_return(AwaitableValue(BLOCK)).once()
+
+    response_uncached = test_client.get("/v1.0/blocks/latest")
+    response_cached = test_client.get("/v1.0/blocks/latest")
+    assert response_uncached.status_code == response_cached.status_code == status.HTTP_200_OK
+    assert response_uncached.content == response_cached.content
+
+
+@pytest.mark.asyncio
+@patch("sidecar.config.CONFIG.tip_cache_ttl", 0)
+async def test_get_block_latest_tip_expires(test_client: TestClient) -> None:
+    flexmock(NODE_ADAPTER).should_receive("get_block_count").with_args().and_return(AwaitableValue(1)).and_return(
+        AwaitableValue(2)
+    ).twice()
+    flexmock(NODE_ADAPTER).should_receive("get_block_by_height").and_return(AwaitableValue(BLOCK_DICT)).twice()
+    flexmock(PARSER).should_receive("decode_block").with_args(BLOCK_DICT).and_return(AwaitableValue(BLOCK)).twice()
+
+    assert test_client.get("/v1.0/blocks/latest").status_code == status.HTTP_200_OK
+    assert test_client.get("/v1.0/blocks/latest").status_code == status.HTTP_200_OK
+
+
 @pytest.mark.parametrize(
     "block_hash",
     [
@@ -137,3 +203,74 @@ async def test_get_transaction(test_client: TestClient, transaction_hash: str) -
     ).once()
     response = test_client.get(f"/v1.0/transactions/{transaction_hash}")
     assert response.status_code == status.HTTP_200_OK
+
+
+@pytest.mark.asyncio
+async def test_get_blocks(test_client: TestClient, fake_redis: FakeRedis) -> None:
+    await fake_redis.set("ethereum/cache/route_get_block_by_height(block_height=10)", b'{"cached":true}')
+    flexmock(NODE_ADAPTER).should_receive("get_block_by_height").with_args(height=10).never()
+    flexmock(NODE_ADAPTER).should_receive("get_block_by_height").with_args(height=11).and_return(
+        AwaitableValue(BLOCK_DICT)
+    ).once()
+    flexmock(NODE_ADAPTER).should_receive("get_block_by_height").with_args(height=12).and_raise(DoesNotExist).once()
+    flexmock(PARSER).should_receive("decode_block").with_args(BLOCK_DICT).and_return(AwaitableValue(BLOCK)).once()
+
+    response = test_client.get("/v1.0/blocks", params={"from": 10, "to": 12})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()[0] == {"cached": True}
+    assert response.json()[1] is not None
+    assert response.json()[2] is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("from_height, to_height", [(10, 9), (1, 1_000)])
+async def test_get_blocks_invalid_range(test_client: TestClient, from_height: int, to_height: int) -> None:
+    flexmock(NODE_ADAPTER).should_receive("get_block_by_height").never()
+    response = test_client.get("/v1.0/blocks", params={"from": from_height, "to": to_height})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.asyncio
+@patch("sidecar.config.CONFIG.limit_default", 2)
+async def test_get_blocks_limits_charged_per_item(test_client: TestClient) -> None:
+    flexmock(NODE_ADAPTER).should_receive("get_block_by_height").never()
+    response = test_client.get("/v1.0/blocks", params={"from": 10, "to": 12})
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+
+
+@pytest.mark.asyncio
+async def test_get_transactions(test_client: TestClient) -> None:
+    flexmock(NODE_ADAPTER).should_receive("get_transaction").with_args("a").and_return(
+        AwaitableValue(TRANSACTION_DICT)
+    ).once()
+    flexmock(NODE_ADAPTER).should_receive("get_transaction").with_args("b").and_raise(DoesNotExist).once()
+    flexmock(PARSER).should_receive("decode_transaction").with_args(TRANSACTION_DICT).and_return(
+        AwaitableValue(TRANSACTION)
+    ).once()
+
+    response = test_client.post("/v1.0/transactions", json=["a", "b"])
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()[0] is not None
+    assert response.json()[1] is None
+
+
+@pytest.mark.asyncio
+@patch("sidecar.config.CONFIG.export_window", 2)
+async def test_export_blocks(test_client: TestClient, fake_redis: FakeRedis) -> None:
+    async def get_block_by_height(height: int) -> dict:
+        if height == 12:
+            raise SkippedBlock
+        return BLOCK_DICT
+
+    flexmock(NODE_ADAPTER).should_receive("get_block_by_height").replace_with(get_block_by_height).times(5)
+    flexmock(PARSER).should_receive("decode_block").with_args(BLOCK_DICT).and_return(AwaitableValue(BLOCK)).times(4)
+
+    response = test_client.get("/v1.0/export/blocks", params={"from": 10, "to": 14})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/x-ndjson"
+
+    lines = response.content.splitlines()
+    assert len(lines) == 5
+    assert lines[2] == b"null"
+    assert lines[0] == lines[1] == lines[3] == lines[4]
+    assert await fake_redis.keys("ethereum/cache/*") == []
@@ -0,0 +1,52 @@
+from pathlib import Path
+
+import pytest
+from fakeredis.aioredis import FakeRedis
+from fastapi.testclient import TestClient
+from flexmock import flexmock
+from genesis.blockchain.exceptions import DoesNotExist
+from genesis.blockchain.tests.utils import AwaitableValue
+
+from sidecar.tests.conftest import BLOCK, BLOCK_DICT, NODE_ADAPTER, PARSER
+from sidecar.warmup import get_block_key, read_checkpoint, warm_up_range
+
+
+@pytest.mark.asyncio
+async def test_warm_up_stores_blocks_and_removes_checkpoint(
+    test_client: TestClient, fake_redis: FakeRedis, tmp_path: Path
+) -> None:
+    checkpoint = str(tmp_path / "checkpoint")
+    flexmock(NODE_ADAPTER).should_receive("get_block_count").and_return(AwaitableValue(100)).once()
+    flexmock(NODE_ADAPTER).should_receive("get_block_by_height").and_return(AwaitableValue(BLOCK_DICT)).times(3)
+    flexmock(PARSER).should_receive("decode_block").with_args(BLOCK_DICT).and_return(AwaitableValue(BLOCK)).times(3)
+
+    assert await warm_up_range(10, 12, concurrency=2, chunk_size=2, checkpoint=checkpoint) == 3
+    for height in (10, 11, 12):
+        assert await fake_redis.get(get_block_key(height)) is not None
+    assert read_checkpoint(checkpoint) is None
+
+
+@pytest.mark.asyncio
+async def test_warm_up_resumes_after_checkpoint(test_client: TestClient, fake_redis: FakeRedis, tmp_path: Path) -> None:
+    checkpoint = tmp_path / "checkpoint"
+    checkpoint.write_text("11")
+    flexmock(NODE_ADAPTER).should_receive("get_block_count").and_return(AwaitableValue(100)).once()
+    flexmock(NODE_ADAPTER).should_receive("get_block_by_height").with_args(height=12).and_return(
+        AwaitableValue(BLOCK_DICT)
+    ).once()
+    flexmock(PARSER).should_receive("decode_block").with_args(BLOCK_DICT).and_return(AwaitableValue(BLOCK)).once()
+
+    assert await warm_up_range(10, 12, concurrency=2, chunk_size=2, checkpoint=str(checkpoint)) == 1
+    assert await fake_redis.get(get_block_key(11)) is None
+
+
+@pytest.mark.asyncio
+async def test_warm_up_skips_cached_and_missing_blocks(
+    test_client: TestClient, fake_redis: FakeRedis, tmp_path: Path
+) -> None:
+    await fake_redis.set(get_block_key(10), b"{}")
+    flexmock(NODE_ADAPTER).should_receive("get_block_count").and_return(AwaitableValue(100)).once()
+    flexmock(NODE_ADAPTER).should_receive("get_block_by_height").with_args(height=11).and_raise(DoesNotExist).once()
+
+    assert await warm_up_range(10, 11, concurrency=2, chunk_size=2, checkpoint=str(tmp_path / "checkpoint")) == 0
+    assert await fake_redis.get(get_block_key(11)) is None
@@ -0,0 +1,49 @@
+import time
+from typing import Optional
+
+from sidecar.async_utils import share_in_flight
+from sidecar.config import CONFIG
+from sidecar.node_limiter import limit_node_calls
+
+
+class Tip:
+    def __init__(self) -> None:
+        self.height: Optional[int] = None
+        self.fetched_at = 0.0
+        self.changed_at = 0.0
+
+    def update(self, height: int) -> None:
+        now = time.monotonic()
+        if height != self.height:
+            self.height = height
+            self.changed_at = now
+        self.fetched_at = now
+
+    def age(self) -> float:
+        return time.monotonic() - self.fetched_at
+
+    def lag(self) -> float:
+        # seconds since the node announced a new block, grows when the node stops syncing
+        return time.monotonic() - self.changed_at
+
+    def reset(self) -> None:
+        self.height = None
+        self.fetched_at = 0.0
+        self.changed_at = 0.0
+
+
+TIP = Tip()
+
+
+async def fetch_tip_height() -> int:
+    async with limit_node_calls("get_block_count"):
+        height = await CONFIG.adapter.get_block_count()
+    TIP.update(height)
+    return height
+
+
+async def get_tip_height() -> int:
+    if TIP.height is not None and TIP.age() < CONFIG.tip_cache_ttl:
+        return TIP.height
+
+    return await share_in_flight("tip", fetch_tip_height)
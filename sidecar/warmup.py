@@ -0,0 +1,159 @@
+import argparse
+import asyncio
+import os
+import time
+from typing import List, Optional, Tuple
+
+from genesis.blockchain.exceptions import DoesNotExist, SkippedBlock
+from genesis.blockchain.factory import NodeAdapterFactory, ParserFactory
+from genesis.logging import logger
+
+from sidecar.block_store import (
+    close_block_store,
+    open_block_store,
+    write_to_block_store,
+)
+from sidecar.caching import (
+    Fetched,
+    call_and_serialize,
+    get_cache_key,
+    get_method_signature,
+    get_stored_seconds,
+)
+from sidecar.config import CONFIG, REDIS
+from sidecar.executor import start_executor, stop_executor
+from sidecar.operations_v1_0 import get_block_by_height
+from sidecar.routes_v1_0 import (
+    BLOCK_BY_HEIGHT_POLICY,
+    get_block_store_prefixes,
+    route_get_block_by_height,
+)
+from sidecar.tip import fetch_tip_height
+
+
+def get_block_key(height: int) -> str:
+    return get_cache_key(get_method_signature(route_get_block_by_height, (), dict(block_height=height)))
+
+
+def read_checkpoint(path: str) -> Optional[int]:
+    if not os.path.exists(path):
+        return None
+
+    with open(path, encoding="utf-8") as file:
+        return int(file.read())
+
+
+def write_checkpoint(path: str, height: int) -> None:
+    # replaced at once so an interrupted run never leaves a partial checkpoint
+    with open(f"{path}.tmp", "w", encoding="utf-8") as file:
+        file.write(str(height))
+    os.replace(f"{path}.tmp", path)
+
+
+def get_throughput(count: int, started: float) -> float:
+    return count / max(time.monotonic() - started, 0.001)
+
+
+async def fetch_block(height: int, semaphore: asyncio.Semaphore) -> Optional[Fetched]:
+    async with semaphore:
+        try:
+            # stored the same way as by the route, including expiry, entries by hash and the block store
+            return await call_and_serialize(
+                get_block_key(height), get_block_by_height, (height,), {}, BLOCK_BY_HEIGHT_POLICY
+            )
+        except (DoesNotExist, SkippedBlock):
+            return None
+
+
+async def store_blocks(fetched: List[Tuple[int, Fetched]]) -> None:
+    async with REDIS.pipeline(transaction=False) as pipe:
+        for height, block in fetched:
+            for key, value in [(get_block_key(height), block.value), *block.related]:
+                pipe.set(key, value, ex=get_stored_seconds(block.seconds) or None)
+        await pipe.execute()
+
+    persistent = [
+        entry
+        for height, block in fetched
+        if block.persistent
+        for entry in [(get_block_key(height), block.value), *block.related]
+    ]
+    if persistent:
+        await write_to_block_store(persistent)
+
+
+async def warm_up_chunk(heights: List[int], concurrency: int) -> int:
+    # blocks which are already cached are not fetched again
+    cached = await REDIS.mget([get_block_key(height) for height in heights])
+    missing = [height for height, value in zip(heights, cached) if not value]
+
+    semaphore = asyncio.Semaphore(concurrency)
+    blocks = await asyncio.gather(*[fetch_block(height, semaphore) for height in missing])
+    fetched = [(height, block) for height, block in zip(missing, blocks) if block is not None]
+    if fetched:
+        await store_blocks(fetched)
+    return len(fetched)
+
+
+async def warm_up_range(first: int, last: int, concurrency: int, chunk_size: int, checkpoint: str) -> int:
+    # expiry of the blocks depends on their distance from the tip
+    await fetch_tip_height()
+
+    done = read_checkpoint(checkpoint)
+    if done is not None and done >= first:
+        logger.info("Resuming after block %d", done)
+        first = done + 1
+
+    started = time.monotonic()
+    total = 0
+    for start in range(first, last + 1, chunk_size):
+        heights = list(range(start, min(start + chunk_size, last + 1)))
+        total += await warm_up_chunk(heights, concurrency)
+        write_checkpoint(checkpoint, heights[-1])
+
+        logger.info("%d/%d: %d blocks fetched, %.1f blocks/s", heights[-1], last, total, get_throughput(total, started))
+
+    # a finished range is not skipped by a later run with the same checkpoint
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+
+    logger.info(
+        "Done: %d blocks in %.1f s, %.1f blocks/s", total, time.monotonic() - started, get_throughput(total, started)
+    )
+    return total
+
+
+async def warm_up(args: argparse.Namespace) -> None:
+    CONFIG.adapter = await NodeAdapterFactory.get_client(
+        CONFIG.node_blockchain, url=CONFIG.node_url, token=CONFIG.node_token
+    )
+    CONFIG.parser = await ParserFactory.get_parser(CONFIG.node_blockchain, CONFIG.adapter)
+    checkpoint = (
+        args.checkpoint or f"warmup-{CONFIG.node_blockchain.blockchain_name}-{args.first}-{args.last}.checkpoint"
+    )
+    await warm_up_range(args.first, args.last, args.concurrency, args.chunk_size, checkpoint)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Preload blocks in a range of heights into the cache")
+    parser.add_argument("first", type=int, help="first height of the range")
+    parser.add_argument("last", type=int, help="last height of the range (inclusive)")
+    parser.add_argument("--concurrency", type=int, default=8, help="blocks fetched from the node at once")
+    parser.add_argument("--chunk-size", type=int, default=100, help="blocks written to redis in one pipeline")
+    parser.add_argument(
+        "--checkpoint",
+        help="file with the last warmed up height, an interrupted run resumes after it (default: named by the range)",
+    )
+    args = parser.parse_args()
+
+    start_executor()
+    open_block_store(get_block_store_prefixes())
+    try:
+        asyncio.run(warm_up(args))
+    finally:
+        close_block_store()
+        stop_executor()
+
+
+if __name__ == "__main__":
+    main()